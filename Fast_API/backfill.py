@@ -0,0 +1,422 @@
+"""Nạp bù dữ liệu lịch sử (giá và tin tức) cho nhiều mã trong một khoảng ngày.
+
+Giá được tải theo lô nhiều mã trong một lần `yf.download`; tin tức lấy từ
+NewsAPI qua `NewsAPIClient` (token bucket dùng chung giữa các thread, chờ theo
+Retry-After khi bị 429). Các tác vụ chạy trên pool thread và ghi bằng upsert
+hàng loạt (ON CONFLICT), nên chạy lại không tạo bản trùng. Tác vụ xong được
+ghi vào file checkpoint; chạy lại cùng lệnh sẽ bỏ qua phần đã hoàn thành.
+
+Cột sentiment của stocks (tổng hợp từ daily_sentiment) và feature store
+(features.py) được cập nhật trong cùng transaction với dữ liệu mới.
+
+Cần ràng buộc unique trên stocks(date, company_id) và news(date, company_id, url)
+của migration 001 (`python storage.py migrate`). Công ty phải có sẵn trong bảng companies.
+
+Ví dụ (chạy trong thư mục Fast_API):
+    python backfill.py --symbols AAPL MSFT NVDA --start 2024-01-01 --end 2024-12-31
+    python backfill.py --sector Technology --start 2023-01-01 --workers 8 --no-news
+    python backfill.py --sector Technology --start 2023-01-01 --checkpoint tech.ckpt   # chạy lại để tiếp tục
+"""
+import argparse
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+
+from database import Company, News, Sector, Stocks, upsert_insert
+from features import materialize_features
+from lazy import lazy_import
+from storage import daily_sentiment_counts, refresh_daily_sentiment, rollup_stock_sentiment
+from telemetry import stage
+
+requests = lazy_import("requests")
+yf = lazy_import("yfinance")
+textblob = lazy_import("textblob")
+
+logger = logging.getLogger(__name__)
+
+NEWS_API_URL = "https://newsapi.org/v2/everything"
+NEWS_PER_DAY = 90  # Cùng giới hạn số tin mỗi ngày với các endpoint trong main.py
+PRICE_FIELDS = {
+    "open": "Open", "high": "High", "low": "Low", "close": "Close",
+    "volume": "Volume", "adj_close": "Adj Close",
+}
+
+# yf.download dùng bảng kết quả toàn cục, gọi song song từ nhiều thread sẽ lẫn dữ liệu;
+# mỗi lần gọi đã tự tải song song các mã trong lô.
+_yf_lock = threading.Lock()
+
+
+class ProviderError(Exception):
+    pass
+
+
+class RateLimiter:
+    """Token bucket dùng chung giữa các thread: trung bình `rate` lần/giây, dồn tối đa `burst` lần."""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.rate:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Dừng mọi thread trong `seconds` giây (khi nhà cung cấp báo vượt giới hạn)."""
+        if not self.rate:
+            time.sleep(seconds)
+            return
+        with self._lock:
+            self._tokens = min(self._tokens, 0.0) - seconds * self.rate
+
+
+class NewsAPIClient:
+    """Client NewsAPI /v2/everything có giới hạn tốc độ và thử lại khi gặp 429/5xx."""
+
+    def __init__(self, api_key, rate=1.0, burst=1, max_retries=3, timeout=30):
+        self.api_key = api_key
+        self.limiter = RateLimiter(rate, burst)
+        self.max_retries = max_retries
+        self.timeout = timeout
+
+    def everything(self, query, day, page_size=100):
+        params = {
+            'q': query,
+            'from': day.strftime('%Y-%m-%d'),
+            'to': day.strftime('%Y-%m-%d'),
+            'language': 'en',
+            'apiKey': self.api_key,
+            'pageSize': page_size
+        }
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            with stage("news_fetch", upstream="newsapi"):
+                response = requests.get(NEWS_API_URL, params=params, timeout=self.timeout)
+            if response.status_code == 200:
+                return response.json().get('articles', [])
+            if response.status_code != 429 and response.status_code < 500:
+                break
+            retry_after = getattr(response, "headers", {}).get("Retry-After")
+            delay = float(retry_after) if retry_after and retry_after.isdigit() else 2 ** attempt
+            logger.warning(f"NewsAPI returned {response.status_code}, retrying in {delay:.0f}s")
+            self.limiter.pause(delay)
+        raise ProviderError(f"NewsAPI returned {response.status_code} for '{query}' on {day}")
+
+
+class Checkpoint:
+    """Các khóa tác vụ đã xong, ghi nối tiếp vào file (mỗi dòng một khóa) nên dừng giữa chừng vẫn giữ được tiến độ."""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.done = set()
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.done = {line.strip() for line in f if line.strip()}
+
+    def __contains__(self, key):
+        return key in self.done
+
+    def mark(self, *keys):
+        with self._lock:
+            self.done.update(keys)
+            if self.path:
+                with open(self.path, "a") as f:
+                    f.write("".join(f"{key}\n" for key in keys))
+                    f.flush()
+                    os.fsync(f.fileno())
+
+
+class Progress:
+    """Đếm symbol-ngày đã xử lý theo loại dữ liệu, để báo thông lượng."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.symbol_days = {"prices": 0, "news": 0}
+        self.rows = {"prices": 0, "news": 0}
+        self.failed = 0
+        self._lock = threading.Lock()
+
+    def add(self, kind, symbol_days, rows):
+        with self._lock:
+            self.symbol_days[kind] += symbol_days
+            self.rows[kind] += rows
+
+    def rate(self, kind):
+        minutes = (time.monotonic() - self.started) / 60
+        return self.symbol_days[kind] / minutes if minutes else 0.0
+
+
+def month_chunks(start, end, months=1):
+    """Chia [start, end] thành các đoạn `months` tháng theo lịch (đoạn đầu/cuối có thể ngắn hơn)."""
+    chunk_start = start
+    while chunk_start <= end:
+        month = chunk_start.month - 1 + months
+        boundary = date(chunk_start.year + month // 12, month % 12 + 1, 1)
+        chunk_end = min(boundary - timedelta(days=1), end)
+        yield chunk_start, chunk_end
+        chunk_start = chunk_end + timedelta(days=1)
+
+
+def article_sentiment(article):
+    text = f"{article.get('title', '')} {article.get('description', '')} {article.get('content', '')}"
+    return 1 if textblob.TextBlob(text).sentiment.polarity > 0 else -1
+
+
+def _published_at(value):
+    # NewsAPI trả về ISO 8601 kiểu "2024-01-05T14:30:00Z"
+    return datetime.fromisoformat(value.replace("Z", "+00:00")) if value else None
+
+
+def upsert_stocks(db, rows):
+    """Ghi giá theo (date, company_id); dòng đã có được cập nhật theo dữ liệu mới."""
+    if not rows:
+        return
+    insert = upsert_insert(db.get_bind())
+    stmt = insert(Stocks)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Stocks.date, Stocks.company_id],
+        set_={column: stmt.excluded[column] for column in (*PRICE_FIELDS, "updated_at")},
+    )
+    db.execute(stmt, rows)
+
+
+def insert_news(db, rows):
+    """Thêm tin, bỏ qua URL đã có trong cùng ngày của công ty."""
+    if not rows:
+        return
+    insert = upsert_insert(db.get_bind())
+    stmt = insert(News).on_conflict_do_nothing(index_elements=[News.date, News.company_id, News.url])
+    db.execute(stmt, rows)
+
+
+def price_rows(frame, companies):
+    """Các dòng stocks từ kết quả yf.download(group_by="ticker") của một lô mã."""
+    rows = []
+    for company in companies:
+        if frame.columns.nlevels > 1:
+            if company.symbol not in frame.columns.get_level_values(0):
+                continue
+            data = frame[company.symbol]
+        else:
+            data = frame
+        data = data.dropna(subset=["Close"])
+        for day, values in zip(data.index, data[list(PRICE_FIELDS.values())].itertuples(index=False)):
+            row = dict(zip(PRICE_FIELDS, values))
+            row["volume"] = int(row["volume"]) if row["volume"] == row["volume"] else None
+            for column in ("open", "high", "low", "close", "adj_close"):
+                row[column] = round(float(row[column]), 2) if row[column] == row[column] else None
+            rows.append({"date": day.date(), "company_id": company.id, **row})
+    return rows
+
+
+def backfill_prices(session_factory, companies, start, end, checkpoint, progress):
+    """Tải giá của một lô mã trong [start, end] bằng một lần yf.download và upsert một lần."""
+    with _yf_lock, stage("yf_download", upstream="yfinance"):
+        frame = yf.download(
+            [company.symbol for company in companies],
+            start=start, end=end + timedelta(days=1),
+            group_by="ticker", auto_adjust=False, progress=False
+        )
+    rows = price_rows(frame, companies)
+    db = session_factory()
+    try:
+        company_ids = [company.id for company in companies]
+        upsert_stocks(db, rows)
+        # Tin có thể đã được nạp trước giá của cùng ngày
+        rollup_stock_sentiment(db, company_ids, start, end)
+        materialize_features(db, company_ids, start, end)
+        db.commit()
+    finally:
+        db.close()
+    checkpoint.mark(*(f"prices:{company.symbol}:{start}:{end}" for company in companies))
+    progress.add("prices", len(companies) * ((end - start).days + 1), len(rows))
+
+
+def backfill_news(session_factory, client, company, days, checkpoint, progress, news_per_day=NEWS_PER_DAY):
+    """Lấy tin từng ngày của một công ty; mỗi ngày ghi trong một transaction rồi đánh dấu checkpoint."""
+    db = session_factory()
+    try:
+        counts = daily_sentiment_counts(db, company.id, days[0], days[-1])
+        for day in days:
+            key = f"news:{company.symbol}:{day}"
+            needed = news_per_day - sum(counts.get(day, (0, 0)))
+            rows = []
+            if needed > 0:
+                for article in client.everything(company.name, day):
+                    if len(rows) >= needed:
+                        break
+                    if not article.get('url'):
+                        continue
+                    with stage("sentiment"):
+                        sentiment = article_sentiment(article)
+                    rows.append({
+                        "date": day,
+                        "company_id": company.id,
+                        "source": (article.get('source') or {}).get('name'),
+                        "name": None,
+                        "title": article.get('title') or "",
+                        "description": article.get('description'),
+                        "url": article.get('url'),
+                        "urltoimage": article.get('urlToImage'),
+                        "publishedat": _published_at(article.get('publishedAt')),
+                        "content": article.get('content'),
+                        "sentiment": sentiment,
+                    })
+                insert_news(db, rows)
+                refresh_daily_sentiment(db, company.id, day, day)
+                rollup_stock_sentiment(db, [company.id], day, day)
+                materialize_features(db, [company.id], day, day)
+                db.commit()
+            checkpoint.mark(key)
+            progress.add("news", 1, len(rows))
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def resolve_companies(db, symbols=None, sector=None):
+    query = db.query(Company)
+    if sector:
+        query = query.join(Sector, Sector.id == Company.sector_id).filter(Sector.name == sector)
+    if symbols:
+        query = query.filter(Company.symbol.in_(symbols))
+    companies = query.order_by(Company.symbol).all()
+    if symbols:
+        missing = sorted(set(symbols) - {company.symbol for company in companies})
+        if missing:
+            logger.warning(f"Skipping symbols not in companies table: {', '.join(missing)}")
+    # Tách khỏi session để dùng trong các thread
+    db.expunge_all()
+    return companies
+
+
+def plan_tasks(companies, start, end, checkpoint, prices=True, news=True, batch_size=50, chunk_months=12):
+    """Danh sách tác vụ chưa xong: ("prices", lô công ty, đầu, cuối) và ("news", công ty, các ngày trong tháng)."""
+    tasks = []
+    if prices:
+        for chunk_start, chunk_end in month_chunks(start, end, chunk_months):
+            pending = [c for c in companies if f"prices:{c.symbol}:{chunk_start}:{chunk_end}" not in checkpoint]
+            for i in range(0, len(pending), batch_size):
+                tasks.append(("prices", pending[i:i + batch_size], chunk_start, chunk_end))
+    if news:
+        for company in companies:
+            for chunk_start, chunk_end in month_chunks(start, end):
+                days = [chunk_start + timedelta(days=x) for x in range((chunk_end - chunk_start).days + 1)]
+                days = [day for day in days if f"news:{company.symbol}:{day}" not in checkpoint]
+                if days:
+                    tasks.append(("news", company, days))
+    return tasks
+
+
+def run_backfill(session_factory, companies, start, end, checkpoint, news_client=None, workers=4,
+                 prices=True, batch_size=50, chunk_months=12, news_per_day=NEWS_PER_DAY, log_every=30.0):
+    """Chạy các tác vụ còn lại trên pool thread; trả về Progress. Tác vụ lỗi không được đánh dấu xong."""
+    tasks = plan_tasks(companies, start, end, checkpoint, prices, news_client is not None, batch_size, chunk_months)
+    progress = Progress()
+    logger.info(f"Backfill {len(companies)} symbols {start}..{end}: {len(tasks)} pending tasks, {workers} workers")
+
+    def run(task):
+        if task[0] == "prices":
+            backfill_prices(session_factory, task[1], task[2], task[3], checkpoint, progress)
+        else:
+            backfill_news(session_factory, news_client, task[1], task[2], checkpoint, progress, news_per_day)
+
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="backfill")
+    futures = {executor.submit(run, task): task for task in tasks}
+    last_log = time.monotonic()
+    try:
+        for done, future in enumerate(as_completed(futures), 1):
+            task = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                progress.failed += 1
+                subject = task[1].symbol if task[0] == "news" else f"{len(task[1])} symbols"
+                logger.error(f"Backfill {task[0]} task for {subject} failed: {e}")
+            if time.monotonic() - last_log >= log_every or done == len(tasks):
+                last_log = time.monotonic()
+                logger.info(
+                    f"{done}/{len(tasks)} tasks, prices {progress.rate('prices'):.0f} symbol-days/min, "
+                    f"news {progress.rate('news'):.0f} symbol-days/min, {progress.failed} failed"
+                )
+    except KeyboardInterrupt:
+        # Phần đã xong nằm trong checkpoint; chạy lại cùng lệnh để tiếp tục
+        executor.shutdown(wait=True, cancel_futures=True)
+        raise
+    executor.shutdown(wait=True)
+    return progress
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Nạp bù giá và tin tức lịch sử cho nhiều mã")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--symbols", nargs="+", help="Danh sách mã")
+    target.add_argument("--sector", help="Tất cả công ty trong ngành")
+    parser.add_argument("--start", type=date.fromisoformat, required=True, help="YYYY-MM-DD")
+    parser.add_argument("--end", type=date.fromisoformat, default=date.today(), help="YYYY-MM-DD, mặc định hôm nay")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=50, help="Số mã mỗi lần yf.download")
+    parser.add_argument("--chunk-months", type=int, default=12, help="Số tháng mỗi lần tải giá")
+    parser.add_argument("--no-prices", action="store_true")
+    parser.add_argument("--no-news", action="store_true")
+    parser.add_argument("--news-per-day", type=int, default=NEWS_PER_DAY)
+    parser.add_argument("--news-rate", type=float, default=float(os.getenv("NEWS_API_RATE", "1.0")),
+                        help="Số request NewsAPI mỗi giây (0: không giới hạn)")
+    parser.add_argument("--checkpoint", default="backfill.ckpt", help="File ghi các tác vụ đã xong")
+    args = parser.parse_args()
+    if args.start > args.end:
+        parser.error("--start must not be after --end")
+
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        companies = resolve_companies(db, args.symbols, args.sector)
+    finally:
+        db.close()
+    if not companies:
+        parser.error("no matching companies")
+
+    news_client = None
+    if not args.no_news:
+        news_client = NewsAPIClient(os.getenv("NEWS_API_KEY"), rate=args.news_rate)
+    progress = run_backfill(
+        SessionLocal, companies, args.start, args.end, Checkpoint(args.checkpoint), news_client,
+        args.workers, not args.no_prices, args.batch_size, args.chunk_months, args.news_per_day
+    )
+    print(
+        f"Prices: {progress.symbol_days['prices']} symbol-days, {progress.rows['prices']} rows, "
+        f"{progress.rate('prices'):.0f} symbol-days/min"
+    )
+    print(
+        f"News: {progress.symbol_days['news']} symbol-days, {progress.rows['news']} articles, "
+        f"{progress.rate('news'):.0f} symbol-days/min"
+    )
+    if progress.failed:
+        print(f"{progress.failed} task(s) failed; run the same command again to retry them", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,392 @@
+"""Backtest offline cho mô hình GRU dự đoán 7 phiên.
+
+Phát lại dữ liệu lịch sử qua đúng input và vòng dự đoán tự hồi quy của
+endpoint /predict-using-gru, với nhiều điểm gốc (rolling-origin) mỗi mã,
+chạy theo batch lớn và song song trên nhiều tiến trình.
+
+Mặc định input là feature đã chuẩn hóa của một phiên bản trong feature store
+(bảng stock_features, hoặc bản xuất của `features.py export`), như endpoint
+dùng khi đã có phiên bản sẵn sàng. `--legacy` dùng cách cũ (chuẩn hóa theo
+min/max giá đóng cửa 30 ngày) trên bảng stocks hoặc file parquet/csv cục bộ,
+như endpoint khi chưa chạy `features.py fit`.
+
+Ví dụ:
+    python backtest.py --workers 4
+    python backtest.py --features data/features_v1 --symbols AAPL MSFT
+    python backtest.py --feature-version 2 --start 2024-01-01 --end 2024-12-31
+    python backtest.py --legacy --fixture data/stocks.parquet --workers 4
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from forecasting import (
+    CLOSE, FORECAST_STEPS, PRICE_WINDOW_DAYS, RAW_COLUMNS,
+    build_sequences, forecast
+)
+from model_serving import BACKENDS, load_backend
+
+# Model của mỗi tiến trình worker, nạp một lần trong initializer
+_model = None
+_model_config = {}
+
+
+def load_fixture(path, symbols=None, start=None, end=None) -> pd.DataFrame:
+    """Đọc dữ liệu từ file parquet/csv có cột symbol, date và RAW_COLUMNS."""
+    if path.endswith(".parquet"):
+        df = pd.read_parquet(path)
+    else:
+        df = pd.read_csv(path)
+    df["date"] = pd.to_datetime(df["date"])
+    return _filter(df, symbols, start, end)
+
+
+def load_from_db(symbols=None, start=None, end=None) -> pd.DataFrame:
+    """Đọc dữ liệu từ bảng stocks bằng một truy vấn duy nhất."""
+    from sqlalchemy import text
+
+    from database import engine
+
+    query = text(
+        "SELECT c.symbol, s.date, " + ", ".join(f"s.{c}" for c in RAW_COLUMNS) +
+        " FROM stocks s JOIN companies c ON c.id = s.company_id"
+        " WHERE s.close IS NOT NULL ORDER BY c.symbol, s.date"
+    )
+    df = pd.read_sql(query, engine)
+    df["date"] = pd.to_datetime(df["date"])
+    return _filter(df, symbols, start, end)
+
+
+def _filter(df, symbols, start, end):
+    if symbols:
+        df = df[df["symbol"].isin(symbols)]
+    if start:
+        df = df[df["date"] >= pd.Timestamp(start)]
+    if end:
+        df = df[df["date"] <= pd.Timestamp(end)]
+    df[list(RAW_COLUMNS)] = df[list(RAW_COLUMNS)].astype(float).fillna(0)
+    return df.sort_values(["symbol", "date"])
+
+
+def load_feature_version(version=None, symbols=None, start=None, end=None):
+    """(params, items) từ bảng stock_features của một phiên bản (mặc định: phiên bản đang phục vụ).
+
+    Mỗi item là (symbol, dates, inputs (n, INPUT_COLUMNS), target (n,) đã chuẩn hóa).
+    """
+    from sqlalchemy import String, cast, select
+
+    from database import Company, SessionLocal, StockFeatures
+    from features import SCALED_COLUMNS, TARGET_COLUMN, assemble_inputs, get_params, serving_params
+    from storage import fetch_columns
+
+    db = SessionLocal()
+    try:
+        params = get_params(db, version) if version else serving_params(db)
+        if params is None:
+            raise ValueError("no ready feature version; run `python features.py fit` or use --legacy")
+        query = select(
+            Company.symbol, cast(StockFeatures.date, String), *(getattr(StockFeatures, c) for c in SCALED_COLUMNS)
+        ).join(Company, Company.id == StockFeatures.company_id).where(StockFeatures.version == params.version)
+        if symbols:
+            query = query.where(Company.symbol.in_(symbols))
+        if start:
+            query = query.where(StockFeatures.date >= start)
+        if end:
+            query = query.where(StockFeatures.date <= end)
+        columns = fetch_columns(db, query.order_by(Company.symbol, StockFeatures.date))
+    finally:
+        db.close()
+
+    if not columns[0]:
+        return params, []
+    names = np.asarray(columns[0])
+    dates = np.asarray(columns[1], dtype="datetime64[D]")
+    scaled = np.column_stack(columns[2:]).astype(float)
+    bounds = np.concatenate([[0], np.flatnonzero(names[1:] != names[:-1]) + 1, [len(names)]])
+    target = SCALED_COLUMNS.index(TARGET_COLUMN)
+    return params, [
+        (str(names[a]), dates[a:b], assemble_inputs(scaled[a:b]), scaled[a:b, target])
+        for a, b in zip(bounds[:-1], bounds[1:])
+    ]
+
+
+def load_feature_export(directory, symbols=None, start=None, end=None):
+    """(params, items) từ bản xuất của `features.py export`, cùng dạng với load_feature_version."""
+    from features import NormalizationParams, load_export
+
+    data = load_export(directory)
+    meta = data["meta"]
+    params = NormalizationParams(meta["version"], meta["minimums"], meta["maximums"])
+    offsets = data["offsets"]
+    names = meta.get("symbols") or [str(data["company_ids"][offset]) for offset in offsets[:-1]]
+    items = []
+    for i, symbol in enumerate(names):
+        if symbols and symbol not in symbols:
+            continue
+        rows = slice(offsets[i], offsets[i + 1])
+        dates = data["dates"][rows]
+        keep = np.ones(len(dates), dtype=bool)
+        if start:
+            keep &= dates >= np.datetime64(start, "D")
+        if end:
+            keep &= dates <= np.datetime64(end, "D")
+        items.append((symbol, dates[keep], np.asarray(data["inputs"][rows][keep], dtype=float),
+                      np.asarray(data["target"][rows][keep], dtype=float)))
+    return params, items
+
+
+def build_feature_windows(inputs: np.ndarray, target: np.ndarray, params, sequence_length: int, stride: int = 1):
+    """Cửa sổ rolling-origin từ feature store, giống `features.read_window` của API.
+
+    Với điểm gốc `o`, input là SEQUENCE_LENGTH dòng tính đến `o` (thiếu thì đệm 0
+    ở đầu); nhãn là giá đóng cửa gốc của FORECAST_STEPS dòng tiếp theo, đổi từ
+    giá trị chuẩn hóa bằng `params.price_range()`.
+    """
+    n = len(inputs)
+    origins = np.arange(0, n - FORECAST_STEPS, stride)
+    if len(origins) == 0:
+        return None
+
+    steps = np.arange(sequence_length)
+    seq_idx = origins[:, None] - sequence_length + 1 + steps[None, :]
+    sequences = np.where((seq_idx >= 0)[..., None], inputs[np.clip(seq_idx, 0, None)], 0.0)
+
+    price_min, price_max = params.price_range()
+    actual = target[origins[:, None] + 1 + np.arange(FORECAST_STEPS)[None, :]] * (price_max - price_min) + price_min
+    return sequences, np.repeat(price_min, len(origins)), np.repeat(price_max, len(origins)), actual
+
+
+def build_windows(dates: np.ndarray, raw: np.ndarray, sequence_length: int, n_features: int, stride: int = 1):
+    """Dựng toàn bộ cửa sổ rolling-origin của một mã bằng phép toán vector.
+
+    Với điểm gốc `o`, dữ liệu gồm các dòng trong PRICE_WINDOW_DAYS ngày
+    lịch tính đến ngày của `o` (tối đa PRICE_WINDOW_DAYS dòng), giống
+    truy vấn 30 ngày của API. Nhãn là giá đóng cửa của FORECAST_STEPS
+    dòng tiếp theo.
+    """
+    n = len(raw)
+    origins = np.arange(0, n - FORECAST_STEPS, stride)
+    if len(origins) == 0:
+        return None
+
+    window_start = np.searchsorted(dates, dates[origins] - np.timedelta64(PRICE_WINDOW_DAYS, "D"))
+    rows = np.minimum(origins - window_start + 1, PRICE_WINDOW_DAYS)
+
+    # Min/max giá đóng cửa của từng cửa sổ (độ dài thay đổi)
+    offsets = np.arange(PRICE_WINDOW_DAYS)
+    price_idx = origins[:, None] - rows[:, None] + 1 + offsets[None, :]
+    price_valid = offsets[None, :] < rows[:, None]
+    closes = raw[np.clip(price_idx, 0, n - 1), CLOSE]
+    price_min = np.where(price_valid, closes, np.inf).min(axis=1)
+    price_max = np.where(price_valid, closes, -np.inf).max(axis=1)
+
+    # Bỏ các cửa sổ có giá phẳng (API cũng sẽ chia cho 0 ở đây)
+    ok = price_max > price_min
+    origins, rows, price_min, price_max = origins[ok], rows[ok], price_min[ok], price_max[ok]
+
+    # SEQUENCE_LENGTH dòng cuối của cửa sổ, phần thiếu để 0 ở cuối như API
+    seq_rows = np.minimum(rows, sequence_length)
+    steps = np.arange(sequence_length)
+    seq_idx = origins[:, None] - seq_rows[:, None] + 1 + steps[None, :]
+    seq_valid = steps[None, :] < seq_rows[:, None]
+    sequences = build_sequences(raw[np.clip(seq_idx, 0, n - 1)], price_min, price_max, n_features)
+    sequences[~seq_valid] = 0
+
+    actual = raw[origins[:, None] + 1 + np.arange(FORECAST_STEPS)[None, :], CLOSE]
+    return sequences, price_min, price_max, actual
+
+
+def _init_worker(backend, model_path, sequence_length, n_features, threads, params=None):
+    global _model
+    os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+    started = time.perf_counter()
+    _model = load_backend(backend, model_path, sequence_length, n_features, threads)
+    _model_config.update(
+        sequence_length=sequence_length,
+        n_features=n_features,
+        params=params,
+        model_load=time.perf_counter() - started,
+    )
+
+
+def _run_symbols(items, batch_size, stride):
+    """Chạy backtest cho một nhóm mã trong tiến trình worker."""
+    busy_started = time.perf_counter()
+    timings = defaultdict(float)
+    if "model_load" in _model_config:
+        timings["model_load"] = _model_config.pop("model_load")
+
+    params = _model_config["params"]
+    next_step = params.next_step if params is not None else None
+    abs_errors, pct_errors, per_symbol = [], [], {}
+    for symbol, dates, *arrays in items:
+        started = time.perf_counter()
+        if params is not None:
+            windows = build_feature_windows(*arrays, params, _model_config["sequence_length"], stride)
+        else:
+            windows = build_windows(dates, *arrays, _model_config["sequence_length"], _model_config["n_features"], stride)
+        timings["features"] += time.perf_counter() - started
+        if windows is None:
+            continue
+        sequences, price_min, price_max, actual = windows
+
+        started = time.perf_counter()
+        predicted = np.empty_like(actual)
+        for i in range(0, len(sequences), batch_size):
+            chunk = slice(i, i + batch_size)
+            predicted[chunk] = forecast(
+                _model.predict,
+                sequences[chunk], price_min[chunk], price_max[chunk], FORECAST_STEPS, next_step
+            )
+        timings["predict"] += time.perf_counter() - started
+
+        started = time.perf_counter()
+        error = np.abs(predicted - actual)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            pct = np.where(actual != 0, error / np.abs(actual) * 100, np.nan)
+        abs_errors.append(error)
+        pct_errors.append(pct)
+        per_symbol[symbol] = {
+            "windows": int(len(actual)),
+            "mae": float(error.mean()),
+            "mape": float(np.nanmean(pct)),
+        }
+        timings["metrics"] += time.perf_counter() - started
+
+    return {
+        "abs_errors": np.concatenate(abs_errors) if abs_errors else np.empty((0, FORECAST_STEPS)),
+        "pct_errors": np.concatenate(pct_errors) if pct_errors else np.empty((0, FORECAST_STEPS)),
+        "per_symbol": per_symbol,
+        "timings": dict(timings),
+        "busy_seconds": time.perf_counter() - busy_started,
+    }
+
+
+def run_backtest(data, backend, model_path=None, workers=1, batch_size=1024, stride=1, sequence_length=30, n_features=8,
+                 params=None):
+    """Chạy backtest và trả về báo cáo dạng dict.
+
+    `data` là DataFrame dữ liệu thô (cách cũ, `params` là None) hoặc các item của
+    load_feature_version/load_feature_export cùng `params` của phiên bản đó.
+    """
+    if params is None:
+        items = [
+            (symbol, group["date"].to_numpy(dtype="datetime64[D]"), group[list(RAW_COLUMNS)].to_numpy(dtype=float))
+            for symbol, group in data.groupby("symbol", sort=True)
+        ]
+    else:
+        items = data
+    # Chia đều các mã cho worker (xen kẽ để cân bằng độ dài chuỗi)
+    chunks = [items[i::workers] for i in range(workers) if items[i::workers]]
+    threads = max(1, (os.cpu_count() or 1) // max(1, workers))
+
+    started = time.perf_counter()
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(
+        max_workers=len(chunks) or 1, mp_context=context,
+        initializer=_init_worker, initargs=(backend, model_path, sequence_length, n_features, threads, params),
+    ) as pool:
+        results = list(pool.map(_run_symbols, chunks, [batch_size] * len(chunks), [stride] * len(chunks)))
+    wall = time.perf_counter() - started
+
+    abs_errors = np.concatenate([r["abs_errors"] for r in results]) if results else np.empty((0, FORECAST_STEPS))
+    pct_errors = np.concatenate([r["pct_errors"] for r in results]) if results else np.empty((0, FORECAST_STEPS))
+    timings = defaultdict(float)
+    per_symbol = {}
+    for r in results:
+        per_symbol.update(r["per_symbol"])
+        for stage, seconds in r["timings"].items():
+            timings[stage] += seconds
+
+    # Thông lượng tính trên thời gian worker bận nhất, không gồm khởi động tiến trình
+    busy = max((r["busy_seconds"] for r in results), default=0.0)
+    n_windows = len(abs_errors)
+    return {
+        "feature_version": params.version if params is not None else None,
+        "symbols": len(per_symbol),
+        "windows": n_windows,
+        "wall_seconds": wall,
+        "busy_seconds": busy,
+        "windows_per_second": n_windows / busy if busy > 0 else 0.0,
+        "mae": float(abs_errors.mean()) if n_windows else None,
+        "mape": float(np.nanmean(pct_errors)) if n_windows else None,
+        "mae_by_step": abs_errors.mean(axis=0).tolist() if n_windows else [],
+        "mape_by_step": np.nanmean(pct_errors, axis=0).tolist() if n_windows else [],
+        # Tổng thời gian CPU của các worker cho từng giai đoạn
+        "stage_seconds": dict(timings),
+        "per_symbol": per_symbol,
+    }
+
+
+def print_report(report):
+    version = report["feature_version"]
+    print(f"Input: {f'feature version {version}' if version else 'legacy (30-day close min/max)'}")
+    print(f"Symbols: {report['symbols']}  Windows: {report['windows']}")
+    print(f"Wall time: {report['wall_seconds']:.2f}s  Busy: {report['busy_seconds']:.2f}s  "
+          f"Throughput: {report['windows_per_second']:.1f} windows/s")
+    if report["windows"]:
+        print(f"MAE: {report['mae']:.4f}  MAPE: {report['mape']:.2f}%")
+        for step, (mae, mape) in enumerate(zip(report["mae_by_step"], report["mape_by_step"]), 1):
+            print(f"  t+{step}: MAE {mae:.4f}  MAPE {mape:.2f}%")
+    print("Stage timings (summed over workers):")
+    for stage, seconds in report["stage_seconds"].items():
+        print(f"  {stage:<12} {seconds:.3f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest rolling-origin cho mô hình GRU")
+    parser.add_argument("--features", help="Thư mục bản xuất của `features.py export`; bỏ trống để đọc bảng stock_features")
+    parser.add_argument("--feature-version", type=int, help="Phiên bản feature (mặc định: phiên bản đang phục vụ)")
+    parser.add_argument("--legacy", action="store_true", help="Input cũ: chuẩn hóa theo giá đóng cửa 30 ngày từ dữ liệu thô")
+    parser.add_argument("--fixture", help="Với --legacy: file parquet/csv cục bộ; bỏ trống để đọc từ bảng stocks")
+    parser.add_argument("--symbols", nargs="*", help="Chỉ chạy các mã này")
+    parser.add_argument("--start", help="Ngày bắt đầu (YYYY-MM-DD)")
+    parser.add_argument("--end", help="Ngày kết thúc (YYYY-MM-DD)")
+    parser.add_argument("--backend", choices=BACKENDS, default=os.getenv("MODEL_BACKEND", "keras"))
+    parser.add_argument("--model", default=os.getenv("MODEL_PATH"), help="Artifact của backend (mặc định trong model_gru/)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch-size", type=int, default=1024)
+    parser.add_argument("--stride", type=int, default=1, help="Khoảng cách giữa các điểm gốc")
+    parser.add_argument("--sequence-length", type=int, default=int(os.getenv("SEQUENCE_LENGTH", "30")))
+    parser.add_argument("--n-features", type=int, default=int(os.getenv("N_FEATURES", "8")))
+    parser.add_argument("--output", help="Ghi báo cáo JSON ra file")
+    args = parser.parse_args()
+    if args.fixture and not args.legacy:
+        parser.error("--fixture chứa dữ liệu thô, chỉ dùng cùng --legacy")
+
+    started = time.perf_counter()
+    params = None
+    if args.legacy and args.fixture:
+        data = load_fixture(args.fixture, args.symbols, args.start, args.end)
+    elif args.legacy:
+        data = load_from_db(args.symbols, args.start, args.end)
+    elif args.features:
+        params, data = load_feature_export(args.features, args.symbols, args.start, args.end)
+    else:
+        try:
+            params, data = load_feature_version(args.feature_version, args.symbols, args.start, args.end)
+        except ValueError as e:
+            parser.error(str(e))
+    load_seconds = time.perf_counter() - started
+
+    report = run_backtest(
+        data, args.backend, args.model, args.workers, args.batch_size, args.stride,
+        args.sequence_length, args.n_features, params,
+    )
+    report["stage_seconds"] = {"load_data": load_seconds, **report["stage_seconds"]}
+    print_report(report)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""Benchmark tái lập được cho các endpoint của Fast_API/main.py.
+
+Dịch vụ ngoài (yfinance, NewsAPI, Finnhub, Alpha Vantage) được thay bằng
+phản hồi ghi sẵn trong benchmarks/fixtures, database là SQLite cục bộ (hoặc
+`--db-url`) chứa dữ liệu giả lập. Ứng dụng chạy trong cùng tiến trình qua
+ASGI, mỗi kịch bản được gọi với số request đồng thời cấu hình được.
+
+Chạy từ thư mục Fast_API:
+    python -m benchmarks.api_bench --concurrency 8 --requests 200 --save-baseline bench_baseline.json
+    python -m benchmarks.api_bench --compare bench_baseline.json --max-regression 10
+"""
+import argparse
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+from benchmarks import fakes
+from benchmarks.seed import seed_database, seed_user
+
+# Biến môi trường tối thiểu để import main mà không cần .env thật
+BENCH_ENV = {
+    "SECRET_KEY": "benchmark-secret-key-not-for-production-use",
+    "ALGORITHM": "HS256",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "60",
+    "SEQUENCE_LENGTH": "30",
+    "N_FEATURES": "8",
+    "TF_CPP_MIN_LOG_LEVEL": "2",
+}
+BENCH_USER = "bench@example.com"
+
+
+class RequestStats:
+    __slots__ = ("db_queries", "upstream_calls")
+
+    def __init__(self):
+        self.db_queries = 0
+        self.upstream_calls = 0
+
+
+# Thống kê của request đang chạy trong task hiện tại
+_current = contextvars.ContextVar("bench_request", default=None)
+
+
+def _count_upstream(provider):
+    stats = _current.get()
+    if stats is not None:
+        stats.upstream_calls += 1
+
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    if stats is not None:
+        stats.db_queries += 1
+
+
+def _parse_published_at(mapper, connection, target):
+    # PostgreSQL nhận chuỗi ISO của NewsAPI trực tiếp, SQLite thì không
+    if isinstance(target.publishedat, str):
+        target.publishedat = datetime.fromisoformat(target.publishedat.replace("Z", "+00:00"))
+
+
+def create_bench_engine(db_url, **connect_args):
+    """Engine cho các benchmark, được đếm SQL như engine của database.py.
+
+    Với SQLite, publishedAt dạng chuỗi của NewsAPI được chuyển sang datetime
+    trước khi ghi, nếu không mọi bài báo thêm qua endpoint đều bị rollback.
+    """
+    from sqlalchemy import create_engine, event
+
+    from database import News
+    from telemetry import instrument_engine
+
+    if db_url.startswith("sqlite"):
+        connect_args.setdefault("check_same_thread", False)
+        if not event.contains(News, "before_insert", _parse_published_at):
+            event.listen(News, "before_insert", _parse_published_at)
+    engine = create_engine(db_url, connect_args=connect_args)
+    instrument_engine(engine)
+    return engine
+
+
+def scenarios(symbols, days_ago):
+    """Mỗi kịch bản trả về (method, url, kwargs) cho request thứ i."""
+    periods = ["1d", "5d", "1mo", "6mo", "1y", "5y"]
+    return {
+        "predict-using-gru": lambda i: ("GET", f"/predict-using-gru/{symbols[i % len(symbols)]}", {}),
+        "news-sentiment": lambda i: ("GET", f"/news-sentiment/{symbols[i % len(symbols)]}/{days_ago}", {}),
+        "news-articles": lambda i: ("GET", f"/news-articles/{symbols[i % len(symbols)]}/{days_ago}", {"params": {"page": i % 5 + 1}}),
+        "market-info": lambda i: ("GET", f"/market-info/{symbols[i % len(symbols)]}", {"params": {"period": periods[i % len(periods)]}}),
+        "watchlist-get": lambda i: ("GET", "/watchlist", {}),
+        "watchlist-name": lambda i: ("GET", "/watchlist_name", {}),
+        "watchlist-put": lambda i: ("PUT", "/watchlist", {"json": {"symbols": symbols[i % len(symbols):][:5]}}),
+        "login": lambda i: ("POST", "/token", {"data": {"username": BENCH_USER, "password": "benchmark"}}),
+    }
+
+
+def setup_app(args):
+    """Import main, trỏ database về engine benchmark và thay dịch vụ ngoài."""
+    for key, value in BENCH_ENV.items():
+        os.environ.setdefault(key, value)
+    from sqlalchemy import event
+
+    import database
+    import main as app
+
+    logging.getLogger().setLevel(args.log_level)
+    app.logger.setLevel(args.log_level)
+
+    engine = create_bench_engine(args.db_url)
+    event.listen(engine, "before_cursor_execute", _count_query)
+    database.Base.metadata.drop_all(bind=engine)
+    database.Base.metadata.create_all(bind=engine)
+    app.SessionLocal.configure(bind=engine)
+
+    calls = fakes.install(app, args.upstream_latency_ms / 1000)
+    calls.listeners.append(_count_upstream)
+
+    session = app.SessionLocal()
+    try:
+        started = time.perf_counter()
+        symbols = seed_database(app, session, args.companies, args.days, args.news_per_day, args.seed)
+        user_id = seed_user(app, session, BENCH_USER, symbols[:5]).id
+        print(f"Seeded {len(symbols)} companies in {time.perf_counter() - started:.1f}s")
+    finally:
+        session.close()
+
+    token = app.create_access_token({"sub": BENCH_USER, "uid": user_id})
+    return app, symbols, token
+
+
+async def run_scenario(client, build, n_requests, concurrency, warmup, headers):
+    async def one(i, record):
+        method, url, kwargs = build(i)
+        stats = RequestStats()
+        token = _current.set(stats)
+        try:
+            started = time.perf_counter()
+            response = await client.request(method, url, headers=headers, **kwargs)
+            elapsed = time.perf_counter() - started
+        finally:
+            _current.reset(token)
+        if record:
+            latencies.append(elapsed)
+            db_queries.append(stats.db_queries)
+            upstream.append(stats.upstream_calls)
+            if response.status_code >= 400:
+                errors.append(response.status_code)
+
+    latencies, db_queries, upstream, errors = [], [], [], []
+    for i in range(warmup):
+        await one(i, record=False)
+
+    next_index = iter(range(n_requests))
+
+    async def worker():
+        for i in next_index:
+            await one(i, record=True)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "requests": n_requests,
+        "errors": len(errors),
+        "throughput_rps": n_requests / wall if wall > 0 else 0.0,
+        "mean_ms": float(latencies_ms.mean()),
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p95_ms": float(np.percentile(latencies_ms, 95)),
+        "p99_ms": float(np.percentile(latencies_ms, 99)),
+        "db_queries_per_request": float(np.mean(db_queries)),
+        "upstream_calls_per_request": float(np.mean(upstream)),
+    }
+
+
+async def run_all(app, symbols, token, args):
+    import httpx
+
+    selected = scenarios(symbols, args.days_ago)
+    names = args.scenarios or list(selected)
+    headers = {"Authorization": f"Bearer {token}"}
+    results = {}
+    transport = httpx.ASGITransport(app=app.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for name in names:
+            if hasattr(app, "market_info_cache"):
+                app.market_info_cache.clear()
+            results[name] = await run_scenario(client, selected[name], args.requests, args.concurrency, args.warmup, headers)
+            print_row(name, results[name])
+    return results
+
+
+def print_row(name, r):
+    print(
+        f"{name:<18} {r['throughput_rps']:>9.1f} rps  p50 {r['p50_ms']:>8.1f}ms  p95 {r['p95_ms']:>8.1f}ms  "
+        f"p99 {r['p99_ms']:>8.1f}ms  db {r['db_queries_per_request']:>7.1f}/req  "
+        f"upstream {r['upstream_calls_per_request']:>5.1f}/req  errors {r['errors']}"
+    )
+
+
+def compare(results, baseline, max_regression):
+    """In chênh lệch so với baseline; trả về True nếu có kịch bản chậm đi quá ngưỡng."""
+    regressed = False
+    print("\nComparison with baseline (throughput / p95):")
+    for name, r in results.items():
+        base = baseline["results"].get(name)
+        if not base:
+            continue
+        rps_delta = (r["throughput_rps"] - base["throughput_rps"]) / base["throughput_rps"] * 100
+        p95_delta = (r["p95_ms"] - base["p95_ms"]) / base["p95_ms"] * 100
+        flag = ""
+        if max_regression is not None and (rps_delta < -max_regression or p95_delta > max_regression):
+            regressed = True
+            flag = "  REGRESSION"
+        print(f"{name:<18} {rps_delta:+7.1f}% rps  {p95_delta:+7.1f}% p95{flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark API với dịch vụ ngoài ghi sẵn")
+    parser.add_argument("--db-url", default=f"sqlite:///{os.path.join(tempfile.gettempdir(), 'api_bench.db')}")
+    parser.add_argument("--scenarios", nargs="*", help="Chỉ chạy các kịch bản này")
+    parser.add_argument("--requests", type=int, default=200, help="Số request mỗi kịch bản")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--companies", type=int, default=20)
+    parser.add_argument("--days", type=int, default=60, help="Số ngày dữ liệu giả lập")
+    parser.add_argument("--news-per-day", type=int, default=90)
+    parser.add_argument("--days-ago", type=int, default=30)
+    parser.add_argument("--upstream-latency-ms", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--save-baseline", help="Ghi kết quả ra file JSON làm baseline")
+    parser.add_argument("--compare", help="So sánh với file baseline JSON")
+    parser.add_argument("--max-regression", type=float, help="Thoát với mã 1 nếu chậm hơn baseline quá %% này")
+    args = parser.parse_args()
+
+    app, symbols, token = setup_app(args)
+    results = asyncio.run(run_all(app, symbols, token, args))
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+        print(f"Baseline saved to {args.save_baseline}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.max_regression):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""Thông lượng nạp bù dữ liệu: backfill.py so với cách endpoint đang làm
+(từng mã, yf.download một mã mỗi lần, kiểm tra và thêm từng dòng).
+
+yfinance và NewsAPI được thay bằng bản giả có độ trễ cấu hình được
+(`--upstream-latency-ms`), database là SQLite tạm. Mỗi cấu hình chạy trên
+database mới và báo symbol-ngày/phút cho giá và tin tức. Cuối cùng kiểm tra
+tiếp tục từ checkpoint: lần chạy đầu có một phần request NewsAPI bị lỗi, lần
+chạy lại chỉ làm các tác vụ còn thiếu và kết quả phải khớp lần chạy sạch.
+
+Chạy từ thư mục Fast_API:
+    python -m benchmarks.backfill_bench --symbols 50 --price-days 365 --news-days 10 --workers 1 4 8
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+from benchmarks import fakes
+from benchmarks.api_bench import create_bench_engine
+from benchmarks.seed import SECTORS, symbols_for
+
+
+def setup_database(db_url):
+    from sqlalchemy.orm import sessionmaker
+
+    import database
+
+    engine = create_bench_engine(db_url, **({"timeout": 30} if db_url.startswith("sqlite") else {}))
+    database.Base.metadata.drop_all(bind=engine)
+    database.Base.metadata.create_all(bind=engine)
+    return engine, sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def seed_companies(session_factory, n_symbols):
+    from database import Company, Sector
+
+    db = session_factory()
+    sector = Sector(name=SECTORS[0])
+    db.add(sector)
+    db.flush()
+    db.add_all([
+        Company(name=f"{symbol} Example Corp.", symbol=symbol, sector_id=sector.id)
+        for symbol in symbols_for(n_symbols)
+    ])
+    db.commit()
+    db.close()
+
+
+def table_counts(session_factory):
+    from sqlalchemy import func
+
+    from database import DailySentiment, News, Stocks
+
+    db = session_factory()
+    try:
+        return {
+            "stocks": db.query(func.count(Stocks.id)).scalar(),
+            "news": db.query(func.count(News.id)).scalar(),
+            "positive": db.query(func.coalesce(func.sum(DailySentiment.positive), 0)).scalar(),
+            "negative": db.query(func.coalesce(func.sum(DailySentiment.negative), 0)).scalar(),
+        }
+    finally:
+        db.close()
+
+
+def sequential(session_factory, companies, price_start, news_start, end, news_per_day):
+    """Cách các endpoint nạp dữ liệu: từng mã, từng dòng giá và từng bài báo."""
+    import backfill
+    from database import News, Stocks
+    from storage import add_daily_sentiment
+
+    db = session_factory()
+    timings = {}
+    started = time.perf_counter()
+    for company in companies:
+        frame = backfill.yf.download(company.symbol, start=price_start, end=end + timedelta(days=1))
+        for day, row in frame.iterrows():
+            exists = db.query(Stocks).filter(Stocks.date == day.date(), Stocks.company_id == company.id).first()
+            if not exists:
+                db.add(Stocks(
+                    date=day.date(), company_id=company.id,
+                    open=float(row['Open']), high=float(row['High']), low=float(row['Low']),
+                    close=float(row['Close']), volume=int(row['Volume']), adj_close=float(row['Adj Close'])
+                ))
+        db.commit()
+    timings["prices"] = time.perf_counter() - started
+
+    client = backfill.NewsAPIClient(None, rate=0)
+    started = time.perf_counter()
+    for company in companies:
+        day = news_start
+        while day <= end:
+            added = 0
+            for article in client.everything(company.name, day):
+                if added >= news_per_day:
+                    break
+                exists = db.query(News).filter(
+                    News.date == day, News.company_id == company.id, News.url == article.get('url')
+                ).first()
+                if exists:
+                    continue
+                sentiment = backfill.article_sentiment(article)
+                db.add(News(
+                    date=day, company_id=company.id, title=article.get('title') or "", url=article.get('url'),
+                    content=article.get('content'), sentiment=sentiment,
+                    publishedat=backfill._published_at(article.get('publishedAt'))
+                ))
+                add_daily_sentiment(db, company.id, day, int(sentiment == 1), int(sentiment == -1))
+                db.commit()
+                added += 1
+            day += timedelta(days=1)
+    timings["news"] = time.perf_counter() - started
+    db.close()
+    return timings
+
+
+def run_mode(mode, workers, args, checkpoint_path=None, failure_rate=0.0):
+    import backfill
+
+    engine, session_factory = setup_database(args.db_url)
+    seed_companies(session_factory, args.symbols)
+    calls = fakes.install(backfill, args.upstream_latency_ms / 1000)
+    if failure_rate:
+        # Một phần request NewsAPI lỗi để mô phỏng lần chạy bị gián đoạn
+        rng = random.Random(0)
+        get = backfill.requests.get
+
+        def flaky_get(url, params=None, **kwargs):
+            if rng.random() < failure_rate:
+                raise ConnectionError("simulated upstream failure")
+            return get(url, params=params, **kwargs)
+
+        backfill.requests.get = flaky_get
+
+    end = date.today()
+    price_start = end - timedelta(days=args.price_days - 1)
+    news_start = end - timedelta(days=args.news_days - 1)
+    db = session_factory()
+    companies = backfill.resolve_companies(db, sector=SECTORS[0])
+    db.close()
+
+    if mode == "sequential":
+        timings = sequential(session_factory, companies, price_start, news_start, end, args.news_per_day)
+    else:
+        checkpoint = backfill.Checkpoint(checkpoint_path)
+        client = backfill.NewsAPIClient(None, rate=0, max_retries=0)
+        timings = {}
+        started = time.perf_counter()
+        backfill.run_backfill(session_factory, companies, price_start, end, checkpoint, None, workers,
+                              batch_size=args.batch_size, log_every=3600)
+        timings["prices"] = time.perf_counter() - started
+        started = time.perf_counter()
+        progress = backfill.run_backfill(session_factory, companies, news_start, end, checkpoint, client, workers,
+                                         prices=False, news_per_day=args.news_per_day, log_every=3600)
+        timings["news"] = time.perf_counter() - started
+        timings["failed"] = progress.failed
+
+    counts = table_counts(session_factory)
+    engine.dispose()
+    return {
+        "prices_symbol_days_per_min": args.symbols * args.price_days / timings["prices"] * 60,
+        "news_symbol_days_per_min": args.symbols * args.news_days / timings["news"] * 60,
+        "upstream_calls": calls.total,
+        "failed": timings.get("failed", 0),
+        **counts,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Thông lượng nạp bù dữ liệu lịch sử")
+    parser.add_argument("--symbols", type=int, default=50)
+    parser.add_argument("--price-days", type=int, default=365)
+    parser.add_argument("--news-days", type=int, default=10)
+    parser.add_argument("--news-per-day", type=int, default=20)
+    parser.add_argument("--workers", nargs="+", type=int, default=[1, 4, 8])
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--upstream-latency-ms", type=float, default=50.0)
+    parser.add_argument("--skip-sequential", action="store_true")
+    parser.add_argument("--db-url", default=None, help="Mặc định: SQLite trong thư mục tạm")
+    parser.add_argument("--output", help="Ghi kết quả ra file JSON")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    tmp = tempfile.TemporaryDirectory()
+    args.db_url = args.db_url or f"sqlite:///{os.path.join(tmp.name, 'backfill_bench.db')}"
+
+    configs = [] if args.skip_sequential else [("sequential", 1)]
+    configs += [("backfill", n) for n in args.workers]
+    print(f"{'mode':<12}{'workers':>8}{'prices sd/min':>15}{'news sd/min':>13}{'calls':>8}{'stocks':>9}{'news':>8}")
+    results = []
+    for mode, workers in configs:
+        r = run_mode(mode, workers, args)
+        results.append({"mode": mode, "workers": workers, **r})
+        print(
+            f"{mode:<12}{workers:>8}{r['prices_symbol_days_per_min']:>15.0f}{r['news_symbol_days_per_min']:>13.0f}"
+            f"{r['upstream_calls']:>8}{r['stocks']:>9}{r['news']:>8}"
+        )
+
+    # Tiếp tục từ checkpoint sau lần chạy có lỗi; kết quả phải giống lần chạy sạch
+    checkpoint_path = os.path.join(tmp.name, "backfill.ckpt")
+    clean = results[-1]
+    interrupted = run_mode("backfill", args.workers[-1], args, checkpoint_path, failure_rate=0.2)
+    import backfill
+
+    # run_mode dựng lại database; chạy lại trên database đó với cùng checkpoint
+    from sqlalchemy.orm import sessionmaker
+
+    engine = create_bench_engine(args.db_url, timeout=30)
+    session_factory = sessionmaker(bind=engine)
+    fakes.install(backfill)
+    db = session_factory()
+    companies = backfill.resolve_companies(db, sector=SECTORS[0])
+    db.close()
+    end = date.today()
+    checkpoint = backfill.Checkpoint(checkpoint_path)
+    progress = backfill.run_backfill(
+        session_factory, companies, end - timedelta(days=args.news_days - 1), end, checkpoint,
+        backfill.NewsAPIClient(None, rate=0), args.workers[-1], prices=False,
+        news_per_day=args.news_per_day, log_every=3600
+    )
+    resumed = table_counts(session_factory)
+    matches = all(resumed[k] == clean[k] for k in ("stocks", "news", "positive", "negative"))
+    print(
+        f"Resume: {interrupted['failed']} failed tasks in first run, {progress.symbol_days['news']} symbol-days redone, "
+        f"counts match clean run: {matches}"
+    )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"config": vars(args), "results": results, "resume_matches": matches}, f, indent=2)
+        print(f"Results saved to {args.output}")
+    engine.dispose()
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
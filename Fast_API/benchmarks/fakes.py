@@ -0,0 +1,232 @@
+"""Bản thay thế yfinance, NewsAPI, Finnhub và Alpha Vantage cho benchmark.
+
+Các phản hồi JSON được ghi sẵn trong thư mục fixtures/ (chạy
+`python -m benchmarks.fakes record` để ghi lại từ dịch vụ thật). Chuỗi giá
+được sinh giả lập, cố định theo mã cổ phiếu, để không phụ thuộc vào dữ
+liệu thị trường thay đổi theo ngày.
+"""
+import argparse
+import json
+import os
+import threading
+import time
+import zlib
+from datetime import datetime
+
+import numpy as np
+
+from lazy import lazy_import
+
+# pandas chỉ cần cho chuỗi giá giả lập, không nạp khi đo khởi động các endpoint nhẹ
+pd = lazy_import("pandas")
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# Số nến trả về cho từng cặp (period, interval) của yf.Ticker.history
+HISTORY_BARS = {
+    ("1d", "1m"): 390,
+    ("5d", "5m"): 390,
+    ("1mo", "1h"): 147,
+    ("6mo", "1d"): 126,
+    ("ytd", "1d"): 200,
+    ("1y", "1d"): 252,
+    ("5y", "1wk"): 260,
+    ("3mo", "1d"): 63,
+    ("5d", "1d"): 5,
+}
+INTERVAL_FREQ = {"1m": "min", "5m": "5min", "1h": "h", "1d": "B", "1wk": "W"}
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name)) as f:
+        return json.load(f)
+
+
+class UpstreamCalls:
+    """Đếm số lần gọi dịch vụ ngoài; `latency` (giây) mô phỏng độ trễ mạng."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.listeners = []
+        self._lock = threading.Lock()
+        self.total = 0
+
+    def hit(self, provider):
+        with self._lock:
+            self.total += 1
+        for listener in self.listeners:
+            listener(provider)
+        if self.latency:
+            time.sleep(self.latency)
+
+
+def synthetic_ohlcv(symbol, index):
+    """Chuỗi OHLCV ngẫu nhiên nhưng cố định theo mã cổ phiếu."""
+    rng = np.random.default_rng(zlib.crc32(symbol.encode()))
+    n = len(index)
+    close = 100 + np.cumsum(rng.normal(0, 1, n))
+    spread = np.abs(rng.normal(0, 0.5, n))
+    return pd.DataFrame({
+        "Open": close + rng.normal(0, 0.3, n),
+        "High": close + spread,
+        "Low": close - spread,
+        "Close": close,
+        "Adj Close": close,
+        "Volume": rng.integers(1_000_000, 50_000_000, n),
+    }, index=index)
+
+
+class FakeResponse:
+    def __init__(self, payload, status_code=200):
+        self._payload = payload
+        self.status_code = status_code
+
+    def json(self):
+        return self._payload
+
+
+class FakeTicker:
+    def __init__(self, symbol, calls):
+        self.symbol = symbol
+        self._calls = calls
+
+    @property
+    def info(self):
+        self._calls.hit("yfinance")
+        info = dict(load_fixture("yfinance_info.json"))
+        info["symbol"] = self.symbol
+        info["longName"] = f"{self.symbol} {info.get('longName', '')}".strip()
+        return info
+
+    def history(self, period="1mo", interval="1d", **kwargs):
+        self._calls.hit("yfinance")
+        bars = HISTORY_BARS.get((period, interval), 100)
+        freq = INTERVAL_FREQ.get(interval, "B")
+        index = pd.date_range(end=pd.Timestamp.now().floor("min"), periods=bars, freq=freq)
+        return synthetic_ohlcv(self.symbol, index)
+
+    @property
+    def financials(self):
+        self._calls.hit("yfinance")
+        columns = pd.date_range(end=pd.Timestamp.now().normalize(), periods=4, freq="YE")
+        rows = ["Total Revenue", "Net Income", "Operating Income"]
+        return pd.DataFrame(np.arange(12, dtype=float).reshape(3, 4) * 1e9, index=rows, columns=columns)
+
+
+class FakeYFinance:
+    """Thay cho module yfinance: Ticker và download."""
+
+    def __init__(self, calls):
+        self._calls = calls
+
+    def Ticker(self, symbol):
+        return FakeTicker(symbol, self._calls)
+
+    def download(self, symbol, start=None, end=None, group_by="column", **kwargs):
+        self._calls.hit("yfinance")
+        index = pd.bdate_range(start=pd.Timestamp(start).normalize(), end=pd.Timestamp(end).normalize(), inclusive="left")
+        if isinstance(symbol, str):
+            return synthetic_ohlcv(symbol, index)
+        # Nhiều mã: cột MultiIndex (mã, trường) như yfinance với group_by="ticker"
+        frame = pd.concat({s: synthetic_ohlcv(s, index) for s in symbol}, axis=1)
+        return frame if group_by == "ticker" else frame.swaplevel(axis=1).sort_index(axis=1)
+
+
+class FakeRequests:
+    """Thay cho module requests: trả về phản hồi NewsAPI/Alpha Vantage đã ghi."""
+
+    def __init__(self, calls):
+        self._calls = calls
+
+    def get(self, url, params=None, **kwargs):
+        if "newsapi.org" in url:
+            self._calls.hit("newsapi")
+            page = load_fixture("newsapi_everything.json")
+            articles = []
+            # Nhân bản bài báo mẫu cho đủ pageSize, URL khác nhau theo truy vấn và ngày
+            size = int((params or {}).get("pageSize", 100))
+            key = f"{params.get('q')}-{params.get('from')}" if params else "all"
+            for i in range(size):
+                article = dict(page["articles"][i % len(page["articles"])])
+                article["url"] = f"{article['url']}?q={key}&n={i}"
+                articles.append(article)
+            return FakeResponse({"status": "ok", "totalResults": len(articles), "articles": articles})
+        if "alphavantage.co" in url:
+            self._calls.hit("alphavantage")
+            return FakeResponse(load_fixture("alphavantage_top_gainers_losers.json"))
+        raise RuntimeError(f"Unexpected upstream call in benchmark: {url}")
+
+
+class FakeFinnhubClient:
+    def __init__(self, calls, api_key=None):
+        self._calls = calls
+
+    def general_news(self, category, min_id=0):
+        self._calls.hit("finnhub")
+        return load_fixture("finnhub_general_news.json")
+
+    def ipo_calendar(self, _from=None, to=None):
+        self._calls.hit("finnhub")
+        return load_fixture("finnhub_ipo_calendar.json")
+
+
+class FakeFinnhub:
+    """Thay cho module finnhub: chỉ cần finnhub.Client."""
+
+    def __init__(self, calls):
+        self._calls = calls
+
+    def Client(self, api_key=None):
+        return FakeFinnhubClient(self._calls, api_key)
+
+
+def install(app_module, latency=0.0):
+    """Thay các client dịch vụ ngoài trong module ứng dụng bằng bản giả."""
+    calls = UpstreamCalls(latency)
+    app_module.yf = FakeYFinance(calls)
+    app_module.requests = FakeRequests(calls)
+    app_module.finnhub = FakeFinnhub(calls)
+    return calls
+
+
+def record(symbol):
+    """Ghi lại phản hồi thật của các dịch vụ vào fixtures/ (cần khóa API trong .env)."""
+    import finnhub
+    import requests
+    import yfinance as yf
+    from dotenv import load_dotenv
+
+    load_dotenv()
+
+    def save(name, payload):
+        with open(os.path.join(FIXTURES_DIR, name), "w") as f:
+            json.dump(payload, f, indent=1, default=str)
+        print(f"Saved {name}")
+
+    info = yf.Ticker(symbol).info
+    save("yfinance_info.json", {k: info.get(k) for k in ("longName", "sector", "industry", "website", "marketCap", "longBusinessSummary")})
+
+    today = datetime.now().strftime("%Y-%m-%d")
+    response = requests.get("https://newsapi.org/v2/everything", params={
+        "q": info.get("longName", symbol), "from": today, "to": today, "language": "en",
+        "apiKey": os.getenv("NEWS_API_KEY"), "pageSize": 100,
+    })
+    save("newsapi_everything.json", response.json())
+
+    client = finnhub.Client(api_key=os.getenv("FINNHUB_API_KEY"))
+    save("finnhub_general_news.json", client.general_news("general", min_id=0))
+    save("finnhub_ipo_calendar.json", client.ipo_calendar(_from=today, to=today))
+
+    response = requests.get(
+        f"https://www.alphavantage.co/query?function=TOP_GAINERS_LOSERS&apikey={os.getenv('ALPHA_VANTAGE_API_KEY_DEMO')}"
+    )
+    save("alphavantage_top_gainers_losers.json", response.json())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Quản lý fixture phản hồi dịch vụ ngoài")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rec = sub.add_parser("record", help="Ghi lại phản hồi thật vào fixtures/")
+    rec.add_argument("--symbol", default="AAPL")
+    args = parser.parse_args()
+    record(args.symbol)
@@ -0,0 +1,124 @@
+"""Benchmark feature store (features.py) trên SQLite tạm với dữ liệu giả lập.
+
+Đo thời gian `fit` (min/max toàn cục và tính feature cho toàn bộ stocks),
+chi phí dựng input GRU mỗi request theo cách cũ (đọc stocks 30 ngày, chuẩn
+hóa trong Python) so với đọc cửa sổ đã tính sẵn (`read_window`), cập nhật
+feature khi có dữ liệu mới và xuất/đọc lại bản xuất cho huấn luyện bằng memmap.
+
+Chạy từ thư mục Fast_API:
+    python -m benchmarks.feature_bench --companies 100 --days 730
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from benchmarks.api_bench import BENCH_ENV, create_bench_engine
+from benchmarks.sector_bench import seed_sector, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark feature store cho model GRU")
+    parser.add_argument("--companies", type=int, default=100)
+    parser.add_argument("--days", type=int, default=730, help="Số ngày lịch của dữ liệu giả lập")
+    parser.add_argument("--requests", type=int, default=200, help="Số lần dựng input mỗi cách")
+    parser.add_argument("--db-url", default=None, help="Mặc định: SQLite trong thư mục tạm")
+    parser.add_argument("--output", help="Ghi kết quả ra file JSON")
+    args = parser.parse_args()
+
+    for key, value in BENCH_ENV.items():
+        os.environ.setdefault(key, value)
+    from sqlalchemy import text
+    from sqlalchemy.orm import sessionmaker
+
+    import database
+    import features
+    from forecasting import PRICE_WINDOW_DAYS, build_sequences, stocks_to_array
+
+    sequence_length = int(os.environ["SEQUENCE_LENGTH"])
+    n_features = int(os.environ["N_FEATURES"])
+    tmp = tempfile.TemporaryDirectory()
+    db_url = args.db_url or f"sqlite:///{os.path.join(tmp.name, 'feature_bench.db')}"
+    engine = create_bench_engine(db_url)
+    database.Base.metadata.drop_all(bind=engine)
+    database.Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    db = session_factory()
+    n_rows = seed_sector(database, db, args.companies, args.days, seed=7)
+    # seed_sector chỉ ghi giá đóng cửa; điền các cột còn lại cho đường dựng input cũ
+    db.execute(text(
+        "UPDATE stocks SET open = close, high = close * 1.01, low = close * 0.99, adj_close = close, "
+        "volume = 1000000 + id % 7919 * 1000"
+    ))
+    db.commit()
+    company_ids = [c for (c,) in db.query(database.Company.id)]
+    print(f"Seeded {args.companies} companies, {n_rows} price rows")
+
+    timings = {}
+    started = time.perf_counter()
+    params = features.fit(session_factory)
+    timings["fit_total"] = (time.perf_counter() - started) * 1000
+
+    end = datetime.now()
+    start = end - timedelta(days=PRICE_WINDOW_DAYS)
+
+    def on_the_fly(i):
+        # Như /predict-using-gru trước khi có feature store
+        stock_data = db.query(database.Stocks).filter(
+            database.Stocks.company_id == company_ids[i % len(company_ids)],
+            database.Stocks.date >= start.date(),
+            database.Stocks.date <= end.date()
+        ).order_by(database.Stocks.date).all()
+        raw = stocks_to_array(stock_data)
+        close = raw[-PRICE_WINDOW_DAYS:, 3]
+        price_min, price_max = np.array([close.min()]), np.array([close.max()])
+        sequence = np.zeros((1, sequence_length, n_features))
+        recent = raw[-sequence_length:]
+        sequence[:, :len(recent)] = build_sequences(recent[None], price_min, price_max, n_features)
+        return sequence
+
+    def from_store(i):
+        return features.read_window(db, company_ids[i % len(company_ids)], params, sequence_length)[1][None]
+
+    counter = iter(range(10 ** 9))
+    _, timings["input_on_the_fly"] = timed(lambda: on_the_fly(next(counter)), args.requests)
+    _, timings["input_from_store"] = timed(lambda: from_store(next(counter)), args.requests)
+    # Cập nhật khi ingest: 30 ngày của một công ty (như mỗi lần /predict-using-gru) và một ngày của 50 công ty (backfill)
+    _, timings["materialize_company_30d"] = timed(
+        lambda: (features.materialize_features(db, [company_ids[0]], start.date(), end.date()), db.commit()), 20
+    )
+    _, timings["materialize_50_companies_1d"] = timed(
+        lambda: (features.materialize_features(db, company_ids[:50], end.date(), end.date()), db.commit()), 20
+    )
+    db.close()
+
+    export_dir = os.path.join(tmp.name, "export")
+    started = time.perf_counter()
+    exported = features.export(session_factory, export_dir)
+    timings["export_total"] = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    data = features.load_export(export_dir)
+    # Duyệt toàn bộ như một epoch huấn luyện
+    checksum = float(np.asarray(data["inputs"][:, 0], dtype=np.float64).sum())
+    timings["memmap_scan"] = (time.perf_counter() - started) * 1000
+
+    print(f"Feature version {params.version}, {exported} rows exported (checksum {checksum:.3f})")
+    print(f"{'step':<30}{'ms':>10}")
+    for name, ms in timings.items():
+        print(f"{name:<30}{ms:>10.2f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"config": vars(args), "rows": n_rows, "timings_ms": timings}, f, indent=2)
+        print(f"Results saved to {args.output}")
+    engine.dispose()
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
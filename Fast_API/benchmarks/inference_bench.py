@@ -0,0 +1,152 @@
+"""So sánh bộ nhớ và thông lượng dự đoán khi mỗi worker tự nạp model
+(embedded) với khi dùng chung một tiến trình suy luận (sidecar, inference.py).
+
+Mỗi worker là một tiến trình riêng mô phỏng phần model của
+/predict-using-gru: lặp lại dự đoán tự hồi quy 7 phiên (7 lần predict batch 1)
+trong `--duration` giây. Báo cáo tổng số dự báo/giây, độ trễ p50/p95 mỗi dự
+báo và tổng RSS của các worker (cộng tiến trình suy luận ở chế độ sidecar).
+
+Chạy từ thư mục Fast_API:
+    python -m benchmarks.inference_bench --workers 1 4 16 --backend tflite
+    python -m benchmarks.inference_bench --modes sidecar --workers 16 --address tcp://127.0.0.1:8765
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.startup_bench import rss_mb
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODES = ("embedded", "sidecar")
+
+
+def _worker(mode, args, barrier, results):
+    os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+    from forecasting import FORECAST_STEPS, forecast
+    from inference import RemoteBackend
+    from model_serving import load_backend, sample_inputs, warm_up
+
+    shape = (args.sequence_length, args.n_features)
+    if mode == "sidecar":
+        model = RemoteBackend(args.address)
+    else:
+        model = load_backend(args.backend, args.model, *shape, args.num_threads)
+        warm_up(model, *shape)
+
+    sequence = sample_inputs(1, *shape)
+    price_min, price_max = np.array([0.0]), np.array([1.0])
+    forecast(model.predict, sequence, price_min, price_max, FORECAST_STEPS)
+
+    latencies = []
+    barrier.wait()
+    started = time.perf_counter()
+    while time.perf_counter() - started < args.duration:
+        call_started = time.perf_counter()
+        forecast(model.predict, sequence, price_min, price_max, FORECAST_STEPS)
+        latencies.append(time.perf_counter() - call_started)
+    results.put({"elapsed": time.perf_counter() - started, "latencies": latencies, "rss_mb": rss_mb()})
+
+
+def start_sidecar(args):
+    command = [
+        sys.executable, "inference.py", "--address", args.address, "serve",
+        "--backend", args.backend, "--max-batch", str(args.max_batch),
+        "--sequence-length", str(args.sequence_length), "--n-features", str(args.n_features),
+    ]
+    if args.model:
+        command += ["--model", args.model]
+    if args.num_threads:
+        command += ["--num-threads", str(args.num_threads)]
+    env = dict(os.environ, TF_CPP_MIN_LOG_LEVEL="2")
+    process = subprocess.Popen(command, cwd=APP_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    from inference import wait_until_healthy
+
+    try:
+        wait_until_healthy(args.address, timeout=args.startup_timeout)
+    except ConnectionError:
+        process.kill()
+        raise
+    return process
+
+
+def run(mode, n_workers, args):
+    ctx = mp.get_context("spawn")
+    barrier = ctx.Barrier(n_workers)
+    results = ctx.Queue()
+    sidecar = start_sidecar(args) if mode == "sidecar" else None
+    try:
+        workers = [ctx.Process(target=_worker, args=(mode, args, barrier, results)) for _ in range(n_workers)]
+        for worker in workers:
+            worker.start()
+        outcomes = [results.get(timeout=args.startup_timeout + args.duration + 60) for _ in workers]
+        for worker in workers:
+            worker.join()
+
+        summary = {}
+        if sidecar is not None:
+            from inference import RemoteBackend
+
+            health = RemoteBackend(args.address).health()
+            summary["sidecar_rss_mb"] = rss_mb(sidecar.pid)
+            summary["mean_batch_rows"] = health["mean_batch_rows"]
+    finally:
+        if sidecar is not None:
+            sidecar.terminate()
+            sidecar.wait()
+
+    latencies_ms = np.concatenate([o["latencies"] for o in outcomes]) * 1000
+    worker_rss = sum(o["rss_mb"] for o in outcomes)
+    summary.update({
+        "forecasts_per_s": sum(len(o["latencies"]) / o["elapsed"] for o in outcomes),
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p95_ms": float(np.percentile(latencies_ms, 95)),
+        "workers_rss_mb": worker_rss,
+        "total_rss_mb": worker_rss + summary.get("sidecar_rss_mb", 0.0),
+    })
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bộ nhớ và thông lượng: model trong từng worker so với tiến trình suy luận dùng chung")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--workers", nargs="+", type=int, default=[1, 4, 16])
+    parser.add_argument("--backend", default=os.getenv("MODEL_BACKEND", "keras"))
+    parser.add_argument("--model", default=os.getenv("MODEL_PATH"), help="Artifact của backend (mặc định trong model_gru/)")
+    parser.add_argument("--num-threads", type=int, default=None)
+    parser.add_argument("--sequence-length", type=int, default=int(os.getenv("SEQUENCE_LENGTH", "30")))
+    parser.add_argument("--n-features", type=int, default=int(os.getenv("N_FEATURES", "8")))
+    parser.add_argument("--address", default=f"unix://{os.path.join(tempfile.gettempdir(), 'inference_bench.sock')}")
+    parser.add_argument("--max-batch", type=int, default=512)
+    parser.add_argument("--duration", type=float, default=10.0, help="Số giây đo cho mỗi cấu hình")
+    parser.add_argument("--startup-timeout", type=float, default=120.0)
+    parser.add_argument("--output", help="Ghi kết quả ra file JSON")
+    args = parser.parse_args()
+
+    print(f"{'mode':<10}{'workers':>8}{'forecasts/s':>13}{'p50 ms':>9}{'p95 ms':>9}{'total RSS MB':>14}{'batch rows':>12}")
+    results = []
+    for mode in args.modes:
+        for n_workers in args.workers:
+            r = run(mode, n_workers, args)
+            results.append({"mode": mode, "workers": n_workers, **r})
+            batch_rows = f"{r['mean_batch_rows']:.2f}" if "mean_batch_rows" in r else "-"
+            print(
+                f"{mode:<10}{n_workers:>8}{r['forecasts_per_s']:>13.1f}{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}"
+                f"{r['total_rss_mb']:>14.0f}{batch_rows:>12}"
+            )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+        print(f"Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""Benchmark /sector-analytics với một ngành nhiều mã (mặc định 500).
+
+Database SQLite tạm chứa giá và daily_sentiment giả lập; một phần mã niêm
+yết muộn hoặc thiếu phiên để panel có ô trống. Báo cáo thời gian từng bước
+(truy vấn, dựng panel, lợi suất, biến động, tương quan, chỉ số), độ trễ
+endpoint khi chưa có cache, khi có cache và sau khi có giá mới, kèm mốc so
+sánh với cách làm bằng pandas (pivot + rolling + corr).
+
+Chạy từ thư mục Fast_API:
+    python -m benchmarks.sector_bench --symbols 500 --days 365
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from benchmarks.api_bench import BENCH_ENV, create_bench_engine
+from benchmarks.seed import symbols_for
+
+SECTOR = "Technology"
+
+
+def seed_sector(app, session, n_symbols, days, seed):
+    """Một ngành với n_symbols mã; khoảng 10% mã niêm yết muộn, 1% phiên bị thiếu."""
+    rng = np.random.default_rng(seed)
+    sector = app.Sector(name=SECTOR)
+    session.add(sector)
+    session.flush()
+    companies = [
+        app.Company(name=f"{symbol} Example Corp.", symbol=symbol, sector_id=sector.id)
+        for symbol in symbols_for(n_symbols)
+    ]
+    session.add_all(companies)
+    session.flush()
+
+    end = datetime.now().date()
+    trading_days = [end - timedelta(days=x) for x in range(days - 1, -1, -1)]
+    trading_days = [d for d in trading_days if d.weekday() < 5]
+    # Nhân tố chung của ngành để tương quan khác 0
+    market = rng.normal(0, 0.01, len(trading_days))
+    stocks, daily = [], []
+    for company in companies:
+        returns = market * rng.uniform(0.5, 1.5) + rng.normal(0, 0.015, len(trading_days))
+        close = 100 * np.cumprod(1 + returns)
+        listed = rng.integers(0, len(trading_days) // 2) if rng.random() < 0.1 else 0
+        for i in range(listed, len(trading_days)):
+            if rng.random() < 0.01:
+                continue
+            stocks.append({"date": trading_days[i], "company_id": company.id, "close": round(float(close[i]), 2)})
+            if rng.random() < 0.6:
+                daily.append({
+                    "company_id": company.id, "date": trading_days[i],
+                    "positive": int(rng.integers(0, 20)), "negative": int(rng.integers(0, 20)),
+                })
+    session.bulk_insert_mappings(app.Stocks, stocks)
+    session.bulk_insert_mappings(app.DailySentiment, daily)
+    session.commit()
+    return len(stocks)
+
+
+def timed(func, repeat):
+    """(kết quả lần cuối, thời gian trung vị ms)."""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        samples.append(time.perf_counter() - started)
+    return result, float(np.median(samples)) * 1000
+
+
+def pandas_baseline(columns, window):
+    import pandas as pd
+
+    frame = pd.DataFrame(dict(zip(["symbol", "date", "close", "positive", "negative"], columns)))
+    close = frame.pivot(index="date", columns="symbol", values="close").sort_index()
+    returns = close.pct_change(fill_method=None)
+    volatility = returns.rolling(window, min_periods=max(2, window // 2)).std() * np.sqrt(252)
+    return volatility, returns.corr(min_periods=window)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark phân tích theo ngành trên panel ngày × mã")
+    parser.add_argument("--symbols", type=int, default=500)
+    parser.add_argument("--days", type=int, default=365, help="Số ngày lịch của dữ liệu giả lập")
+    parser.add_argument("--window", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--db-url", default=None, help="Mặc định: SQLite trong thư mục tạm")
+    parser.add_argument("--skip-pandas", action="store_true")
+    parser.add_argument("--output", help="Ghi kết quả ra file JSON")
+    args = parser.parse_args()
+
+    for key, value in BENCH_ENV.items():
+        os.environ.setdefault(key, value)
+    from fastapi.testclient import TestClient
+
+    import database
+    import main as app
+    import panel
+
+    tmp = tempfile.TemporaryDirectory()
+    db_url = args.db_url or f"sqlite:///{os.path.join(tmp.name, 'sector_bench.db')}"
+    engine = create_bench_engine(db_url)
+    database.Base.metadata.drop_all(bind=engine)
+    database.Base.metadata.create_all(bind=engine)
+    app.SessionLocal.configure(bind=engine)
+
+    session = app.SessionLocal()
+    started = time.perf_counter()
+    n_rows = seed_sector(app, session, args.symbols, args.days, args.seed)
+    print(f"Seeded {args.symbols} symbols, {n_rows} price rows in {time.perf_counter() - started:.1f}s")
+
+    sector_id = session.query(app.Sector.id).filter(app.Sector.name == SECTOR).scalar()
+    start_date = datetime.now().date() - timedelta(days=args.days)
+
+    def load():
+        return app.load_sector_panel(session, sector_id, start_date)
+
+    timings = {}
+    columns, timings["load_query"] = timed(load, args.repeat)
+    (dates, symbols, close, positive, negative), timings["build_panel"] = timed(lambda: panel.build_panel(*columns), args.repeat)
+    returns, timings["returns"] = timed(lambda: panel.simple_returns(close), args.repeat)
+    _, timings["rolling_volatility"] = timed(lambda: panel.rolling_volatility(returns, args.window), args.repeat)
+    _, timings["correlation"] = timed(lambda: panel.correlation_matrix(returns, args.window), args.repeat)
+    weights = panel.sentiment_weights(positive, negative)
+    _, timings["sentiment_index"] = timed(lambda: panel.weighted_index(returns, weights), args.repeat)
+    _, timings["analytics_total"] = timed(lambda: panel.sector_analytics(*columns, window=args.window), args.repeat)
+    if not args.skip_pandas:
+        _, timings["pandas_vol_corr"] = timed(lambda: pandas_baseline(columns, args.window), args.repeat)
+
+    client = TestClient(app.app)
+    url = f"/sector-analytics/{SECTOR}"
+    params = {"days": args.days, "window": args.window}
+
+    def request():
+        response = client.get(url, params=params)
+        response.raise_for_status()
+        return response
+
+    def cold():
+        app.sector_analytics_cache.clear()
+        return request()
+
+    response, timings["endpoint_cold"] = timed(cold, args.repeat)
+    _, timings["endpoint_warm"] = timed(request, args.repeat * 20)
+
+    # Giá của phiên kế tiếp làm cache cũ hết hiệu lực (mỗi (date, company_id) chỉ có một dòng)
+    last = session.query(app.Stocks).order_by(app.Stocks.id.desc()).first()
+    next_day = last.date + timedelta(days=1)
+    while next_day.weekday() > 4:
+        next_day += timedelta(days=1)
+    session.add(app.Stocks(date=next_day, company_id=last.company_id, close=last.close))
+    session.commit()
+    _, timings["endpoint_after_new_row"] = timed(request, 1)
+    session.close()
+
+    body = response.json()
+    print(f"Panel {len(body['dates'])} dates x {len(body['symbols'])} symbols, response {len(response.content) / 1e6:.1f} MB")
+    print(f"{'step':<26}{'ms':>10}")
+    for name, ms in timings.items():
+        print(f"{name:<26}{ms:>10.1f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"config": vars(args), "rows": n_rows, "timings_ms": timings}, f, indent=2)
+        print(f"Results saved to {args.output}")
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
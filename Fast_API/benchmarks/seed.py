@@ -0,0 +1,80 @@
+"""Sinh dữ liệu giả lập (sector, company, stocks, news, user) cho benchmark."""
+import random
+from datetime import datetime, timedelta
+
+from benchmarks.fakes import load_fixture, synthetic_ohlcv
+from lazy import lazy_import
+
+pd = lazy_import("pandas")
+
+SECTORS = ["Technology", "Healthcare", "Financial Services", "Energy", "Consumer Cyclical"]
+
+
+def symbols_for(n_companies):
+    return [f"SYM{i:03d}" for i in range(n_companies)]
+
+
+def seed_database(app, session, n_companies=20, days=60, news_per_day=90, seed=42):
+    """Ghi dữ liệu giả lập vào database đã tạo bảng; trả về danh sách mã."""
+    rng = random.Random(seed)
+    articles = load_fixture("newsapi_everything.json")["articles"]
+
+    sectors = [app.Sector(name=name) for name in SECTORS]
+    session.add_all(sectors)
+    session.flush()
+
+    symbols = symbols_for(n_companies)
+    companies = [
+        app.Company(name=f"{symbol} Example Corp.", symbol=symbol, sector_id=sectors[i % len(sectors)].id)
+        for i, symbol in enumerate(symbols)
+    ]
+    session.add_all(companies)
+    session.flush()
+
+    end = datetime.now().date()
+    dates = [end - timedelta(days=x) for x in range(days)][::-1]
+    trading_days = pd.bdate_range(start=dates[0], end=dates[-1])
+
+    stocks, news, daily = [], [], []
+    for company in companies:
+        prices = synthetic_ohlcv(company.symbol, trading_days)
+        for date, row in prices.iterrows():
+            stocks.append({
+                "date": date.date(), "company_id": company.id,
+                "open": round(float(row["Open"]), 2), "high": round(float(row["High"]), 2),
+                "low": round(float(row["Low"]), 2), "close": round(float(row["Close"]), 2),
+                "volume": int(row["Volume"]), "adj_close": round(float(row["Adj Close"]), 2),
+            })
+        for date in dates:
+            positive = 0
+            for n in range(news_per_day):
+                article = articles[n % len(articles)]
+                sentiment = rng.choice((1, -1))
+                positive += sentiment == 1
+                news.append({
+                    "date": date, "company_id": company.id,
+                    "source": article["source"]["name"], "title": article["title"],
+                    "description": article["description"],
+                    "url": f"https://seed.example.com/{company.symbol}/{date}/{n}",
+                    "urltoimage": article["urlToImage"],
+                    "publishedat": datetime.combine(date, datetime.min.time()),
+                    "content": article["content"], "sentiment": sentiment,
+                })
+            daily.append({"company_id": company.id, "date": date, "positive": positive, "negative": news_per_day - positive})
+
+    session.bulk_insert_mappings(app.Stocks, stocks)
+    session.bulk_insert_mappings(app.News, news)
+    session.bulk_insert_mappings(app.DailySentiment, daily)
+    session.commit()
+    return symbols
+
+
+def seed_user(app, session, email, symbols):
+    """Tạo user benchmark với watchlist gồm `symbols`."""
+    user = app.User(email=email, hashed_password=app.hash_password("benchmark"))
+    session.add(user)
+    session.flush()
+    companies = session.query(app.Company).filter(app.Company.symbol.in_(symbols)).all()
+    session.add_all([app.UserWatchlist(user_id=user.id, company_id=c.id) for c in companies])
+    session.commit()
+    return user
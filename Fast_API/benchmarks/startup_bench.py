@@ -0,0 +1,175 @@
+"""Đo thời gian khởi động và bộ nhớ (RSS) của một worker API.
+
+Mỗi lượt chạy trong một tiến trình Python mới: import main, chạy lifespan
+(startup), rồi gọi lần đầu các endpoint nhẹ (/token, /watchlist,
+/market-news) và cuối cùng là /predict-using-gru để thấy chi phí nạp model
+rơi vào đâu. Database là SQLite tạm, Finnhub/NewsAPI/yfinance được thay
+bằng fixture như api_bench.
+
+Chạy từ thư mục Fast_API:
+    python -m benchmarks.startup_bench --runs 3
+    python -m benchmarks.startup_bench --modes lazy preload --no-predict
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.api_bench import BENCH_ENV, BENCH_USER, create_bench_engine
+
+# Biến môi trường thêm vào theo từng chế độ khởi động
+MODES = {
+    "lazy": {"MODEL_PRELOAD": "0"},
+    "preload": {"MODEL_PRELOAD": "1"},
+}
+
+
+def rss_mb(pid="self"):
+    """RSS hiện tại của tiến trình (MB), mặc định là tiến trình đang chạy."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        if pid != "self":
+            return float("nan")
+    import resource
+
+    # ru_maxrss là đỉnh RSS (KB trên Linux, byte trên macOS)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def child(args):
+    """Chạy trong tiến trình con; in một dòng JSON kết quả."""
+    started = time.perf_counter()
+    excluded = 0.0
+    result = {}
+
+    def mark(name):
+        result[f"{name}_s"] = time.perf_counter() - started - excluded
+        result[f"{name}_rss_mb"] = rss_mb()
+
+    import main as app
+
+    mark("import")
+    heavy = ("tensorflow", "yfinance", "pandas", "textblob", "finnhub", "sklearn")
+    result["heavy_modules_after_import"] = [name for name in heavy if name in sys.modules]
+
+    # Chuẩn bị database và client không tính vào thời gian đo
+    setup_started = time.perf_counter()
+    from fastapi.testclient import TestClient
+
+    import database
+    from benchmarks import fakes
+
+    engine = create_bench_engine(args.db_url)
+    database.Base.metadata.create_all(bind=engine)
+    app.SessionLocal.configure(bind=engine)
+    fakes.install(app)
+    excluded = time.perf_counter() - setup_started
+
+    with TestClient(app.app) as client:
+        mark("startup")
+
+        response = client.post("/token", data={"username": BENCH_USER, "password": "benchmark"})
+        token = response.json()["access_token"]
+        mark("first_token")
+        headers = {"Authorization": f"Bearer {token}"}
+        client.get("/watchlist", headers=headers).raise_for_status()
+        mark("first_watchlist")
+        client.get("/market-news").raise_for_status()
+        mark("first_market_news")
+        if args.predict:
+            client.get(f"/predict-using-gru/{args.symbol}").raise_for_status()
+            mark("first_predict")
+
+    print(json.dumps(result))
+
+
+def prepare_database(db_url):
+    """Tạo SQLite với user benchmark và một công ty (chạy một lần trước các lượt đo)."""
+    for key, value in BENCH_ENV.items():
+        os.environ.setdefault(key, value)
+    import database
+    import main as app
+    from benchmarks.seed import seed_database, seed_user
+
+    engine = create_bench_engine(db_url)
+    database.Base.metadata.drop_all(bind=engine)
+    database.Base.metadata.create_all(bind=engine)
+    app.SessionLocal.configure(bind=engine)
+    session = app.SessionLocal()
+    try:
+        symbols = seed_database(app, session, n_companies=1, days=45, news_per_day=90)
+        seed_user(app, session, BENCH_USER, symbols)
+    finally:
+        session.close()
+    return symbols[0]
+
+
+def run(mode, args):
+    env = dict(os.environ)
+    for key, value in BENCH_ENV.items():
+        env.setdefault(key, value)
+    env.update(MODES[mode])
+    command = [sys.executable, "-m", "benchmarks.startup_bench", "--child", "--db-url", args.db_url, "--symbol", args.symbol]
+    if not args.predict:
+        command.append("--no-predict")
+    started = time.perf_counter()
+    completed = subprocess.run(command, env=env, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"Startup run ({mode}) failed:\n{completed.stderr}")
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result["process_s"] = time.perf_counter() - started
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Đo thời gian khởi động và RSS của worker API")
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES))
+    parser.add_argument("--runs", type=int, default=3, help="Số tiến trình mỗi chế độ, lấy trung vị")
+    parser.add_argument("--db-url", default=f"sqlite:///{os.path.join(tempfile.gettempdir(), 'startup_bench.db')}")
+    parser.add_argument("--no-predict", dest="predict", action="store_false", help="Bỏ qua /predict-using-gru")
+    parser.add_argument("--output", help="Ghi kết quả ra file JSON")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--symbol", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args)
+        return
+
+    args.symbol = prepare_database(args.db_url)
+    steps = ["import", "startup", "first_token", "first_watchlist", "first_market_news"]
+    if args.predict:
+        steps.append("first_predict")
+
+    results = {}
+    for mode in args.modes:
+        runs = [run(mode, args) for _ in range(args.runs)]
+        summary = {
+            key: statistics.median(r[key] for r in runs)
+            for key in runs[0] if key.endswith(("_s", "_rss_mb"))
+        }
+        summary["heavy_modules_after_import"] = runs[0]["heavy_modules_after_import"]
+        results[mode] = summary
+
+        print(f"\n{mode} (median of {args.runs} runs, time since process start / RSS)")
+        for step in steps:
+            print(f"  {step:<20} {summary[f'{step}_s']:>8.2f}s {summary[f'{step}_rss_mb']:>9.0f} MB")
+        print(f"  heavy modules after import: {', '.join(summary['heavy_modules_after_import']) or 'none'}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+# Kết nối database và các model ORM dùng chung cho API, backtest và benchmark.
+# Chỉ phụ thuộc SQLAlchemy nên import nhanh, không kéo theo TensorFlow hay pandas.
+import os
+from datetime import datetime
+
+from sqlalchemy import (
+    Boolean, Column, Integer, String, Date, Text, Float,
+    ForeignKey, DECIMAL, UniqueConstraint, create_engine, func
+)
+from sqlalchemy.dialects.postgresql import TIMESTAMP
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import relationship, sessionmaker
+
+from dotenv import load_dotenv
+
+from telemetry import instrument_engine
+
+load_dotenv()
+
+# Database configuration
+SQLALCHEMY_DATABASE_URL = f"postgresql://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}/{os.getenv('DB_NAME')}"
+engine = create_engine(SQLALCHEMY_DATABASE_URL)
+instrument_engine(engine)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+Base = declarative_base()
+
+
+# Database Models
+class User(Base):
+    __tablename__ = "users"
+    id = Column(Integer, primary_key=True, index=True)
+    email = Column(String(255), unique=True, index=True)
+    hashed_password = Column(String(255))
+
+    # Sử dụng quan hệ để lấy dữ liệu từ bảng UserWatchlist
+    watchlist_items = relationship("UserWatchlist", back_populates="user", cascade="all, delete-orphan")
+
+class Sector(Base):
+    __tablename__ = "sectors"
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(100), unique=True, index=True)
+
+    companies = relationship("Company", back_populates="sector")
+
+class Company(Base):
+    __tablename__ = "companies"
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(255), nullable=False)
+    symbol = Column(String(10), unique=True, nullable=False)
+    sector_id = Column(Integer, ForeignKey("sectors.id"))
+    description = Column(Text, nullable=True)
+
+    sector = relationship("Sector", back_populates="companies")  # Quan hệ với bảng Sector
+    stocks = relationship("Stocks", back_populates="company")
+    news = relationship("News", back_populates="company")
+
+class Stocks(Base):
+    __tablename__ = "stocks"
+    id = Column(Integer, primary_key=True)
+    date = Column(Date, nullable=False)
+    company_id = Column(Integer, ForeignKey("companies.id"))
+    open = Column(DECIMAL(10, 2), nullable=True)
+    high = Column(DECIMAL(10, 2), nullable=True)
+    low = Column(DECIMAL(10, 2), nullable=True)
+    close = Column(DECIMAL(10, 2), nullable=True)
+    volume = Column(Integer, nullable=True)
+    adj_close = Column(DECIMAL(10, 2), nullable=True)
+    news_positive_sentiment = Column(Integer, nullable=True)
+    news_negative_sentiment = Column(Integer, nullable=True)
+    # Lần ghi gần nhất (UTC), kể cả cập nhật tại chỗ; dấu thay đổi cho cache /sector-analytics
+    updated_at = Column(TIMESTAMP, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+    company = relationship("Company", back_populates="stocks")
+
+    # Trùng với ràng buộc của migration 001; là đích ON CONFLICT khi upsert (backfill.py)
+    __table_args__ = (UniqueConstraint("date", "company_id", name="uq_stocks_date_company"),)
+
+class News(Base):
+    __tablename__ = "news"
+    id = Column(Integer, primary_key=True)
+    date = Column(Date, nullable=False)
+    company_id = Column(Integer, ForeignKey("companies.id"))
+    source = Column(String(255), nullable=True)
+    name = Column(String(255), nullable=True)
+    title = Column(Text, nullable=False)
+    description = Column(Text, nullable=True)
+    url = Column(Text, nullable=True)
+    urltoimage = Column(Text, nullable=True)  # Changed from urlToImage to urltoimage
+    publishedat = Column(TIMESTAMP, nullable=True)  # Changed from publishedAt to publishedat
+    content = Column(Text, nullable=True)
+    sentiment = Column(Integer,nullable=True) # thêm sentiment
+
+    company = relationship("Company", back_populates="news")
+
+    __table_args__ = (UniqueConstraint("date", "company_id", "url", name="uq_news_date_company_url"),)
+
+class DailySentiment(Base):
+    """Số tin tích cực/tiêu cực theo công ty và ngày, cập nhật cùng lúc thêm tin (xem storage.py)."""
+    __tablename__ = "daily_sentiment"
+    company_id = Column(Integer, ForeignKey("companies.id", ondelete="CASCADE"), primary_key=True)
+    date = Column(Date, primary_key=True)
+    positive = Column(Integer, nullable=False, default=0)
+    negative = Column(Integer, nullable=False, default=0)
+    updated_at = Column(TIMESTAMP, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+
+class FeatureParams(Base):
+    """Tham số chuẩn hóa min-max của một phiên bản feature (xem features.py); minimums/maximums là JSON theo cột."""
+    __tablename__ = "feature_params"
+    version = Column(Integer, primary_key=True)
+    created_at = Column(TIMESTAMP, nullable=False, server_default=func.now())
+    minimums = Column(Text, nullable=False)
+    maximums = Column(Text, nullable=False)
+    ready = Column(Boolean, nullable=False, default=False)
+
+class StockFeatures(Base):
+    """Feature đã chuẩn hóa của một phiên giao dịch theo phiên bản tham số."""
+    __tablename__ = "stock_features"
+    version = Column(Integer, ForeignKey("feature_params.version", ondelete="CASCADE"), primary_key=True)
+    company_id = Column(Integer, ForeignKey("companies.id", ondelete="CASCADE"), primary_key=True)
+    date = Column(Date, primary_key=True)
+    open = Column(Float, nullable=False)
+    high = Column(Float, nullable=False)
+    low = Column(Float, nullable=False)
+    close = Column(Float, nullable=False)
+    adj_close = Column(Float, nullable=False)
+    volume = Column(Float, nullable=False)
+    positive = Column(Float, nullable=False)
+    negative = Column(Float, nullable=False)
+
+class UserWatchlist(Base):
+    __tablename__ = "userwatchlist"
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
+    company_id = Column(Integer, ForeignKey("companies.id", ondelete="CASCADE"))
+    # Thiết lập mối quan hệ với bảng User và Company
+    user = relationship("User", back_populates="watchlist_items")
+    company = relationship("Company")
+
+
+def upsert_insert(bind):
+    """Hàm insert hỗ trợ ON CONFLICT của dialect đang dùng (PostgreSQL hoặc SQLite)."""
+    if bind.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif bind.dialect.name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"Upsert is not supported for dialect '{bind.dialect.name}'")
+    return insert
+
+
+# Hàm get_db để quản lý database session
+def get_db():
+    """Tạo và quản lý database session"""
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
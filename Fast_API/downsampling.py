@@ -0,0 +1,41 @@
+# Giảm số điểm của chuỗi giá trước khi trả về cho biểu đồ
+import numpy as np
+
+
+def lttb_indices(y, max_points: int) -> np.ndarray:
+    """Chọn chỉ số các điểm giữ lại theo Largest-Triangle-Three-Buckets.
+
+    Trục x là vị trí của nến trong chuỗi (giống cách frontend vẽ). Điểm
+    đầu và cuối luôn được giữ; mỗi bucket ở giữa giữ điểm tạo tam giác
+    lớn nhất với điểm đã chọn trước đó và trung bình của bucket kế tiếp,
+    nhờ vậy các đỉnh và đáy nhìn thấy được không bị mất.
+    """
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if max_points is None or max_points < 3 or n <= max_points:
+        return np.arange(n)
+
+    n_buckets = max_points - 2
+    edges = np.linspace(1, n - 1, n_buckets + 1).astype(np.intp)
+    counts = np.diff(edges)
+
+    # Trung bình (x, y) của từng bucket tính một lần bằng reduceat
+    x = np.arange(n, dtype=float)
+    avg_x = np.add.reduceat(x[:-1], edges[:-1]) / counts
+    avg_y = np.add.reduceat(y[:-1], edges[:-1]) / counts
+    next_x = np.append(avg_x[1:], x[-1])
+    next_y = np.append(avg_y[1:], y[-1])
+
+    selected = np.empty(max_points, dtype=np.intp)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(n_buckets):
+        lo, hi = edges[i], edges[i + 1]
+        area = np.abs(
+            (x[a] - next_x[i]) * (y[lo:hi] - y[a])
+            - (x[a] - x[lo:hi]) * (next_y[i] - y[a])
+        )
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
@@ -0,0 +1,353 @@
+"""Feature store cho input của GRU, dùng chung giữa huấn luyện và phục vụ.
+
+Feature được chuẩn hóa min-max toàn cục như notebook huấn luyện
+(`MinMaxScaler` trên toàn bộ dữ liệu, giá trị thiếu là 0). Mỗi lần `fit` tạo
+một phiên bản tham số mới trong bảng feature_params, tính feature cho toàn
+bộ stocks rồi mới đánh dấu sẵn sàng; phục vụ luôn dùng phiên bản sẵn sàng mới
+nhất (hoặc FEATURE_VERSION nếu đặt).
+
+Khi ghi giá/tin tức (endpoint, backfill.py), `materialize_features` tính lại
+các dòng bị ảnh hưởng bằng một câu INSERT ... SELECT ON CONFLICT; phục vụ chỉ
+đọc SEQUENCE_LENGTH phiên gần nhất theo khóa chính (`read_window`). Huấn
+luyện xuất cùng feature ra file .npy đọc bằng memmap (`export`, `load_export`).
+
+Ví dụ (chạy trong thư mục Fast_API):
+    python features.py fit
+    python features.py status
+    python features.py export --output data/features_v1
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from datetime import date, timedelta
+
+import numpy as np
+from sqlalchemy import Float, String, and_, cast, func, select
+
+from cache import TTLCache
+from database import Company, DailySentiment, FeatureParams, StockFeatures, Stocks, upsert_insert
+
+logger = logging.getLogger(__name__)
+
+# Các cột được chuẩn hóa, như scaler trong notebook
+SCALED_COLUMNS = ("open", "high", "low", "close", "adj_close", "volume", "positive", "negative")
+# Thứ tự input của GRU (notebook: Open, High, Low, Adj Close, Volume, Symbol, Positive, Negative); close là nhãn
+INPUT_COLUMNS = ("open", "high", "low", "adj_close", "volume", "symbol", "positive", "negative")
+TARGET_COLUMN = "close"
+# Ánh xạ mã -> số của notebook không tái lập được; dùng 0 như lúc phục vụ trước đây
+SYMBOL_INDEX = 0.0
+
+FEATURE_VERSION = int(os.getenv("FEATURE_VERSION", "0")) or None
+_params_cache = TTLCache(maxsize=8, ttl=int(os.getenv("FEATURE_PARAMS_CACHE_TTL", "60")))
+
+
+class NormalizationParams:
+    """Min/max theo cột của một phiên bản."""
+
+    def __init__(self, version, minimums, maximums, ready=True):
+        self.version = version
+        self.minimums = minimums
+        self.maximums = maximums
+        self.ready = ready
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(row.version, json.loads(row.minimums), json.loads(row.maximums), row.ready)
+
+    def scale(self, column):
+        """1 / (max - min); 0 nếu cột là hằng số (MinMaxScaler cũng cho 0)."""
+        span = self.maximums[column] - self.minimums[column]
+        return 1.0 / span if span > 0 else 0.0
+
+    def price_range(self):
+        """(min, max) của giá đóng cửa dạng mảng (1,), để đổi kết quả model về giá gốc."""
+        return np.array([self.minimums[TARGET_COLUMN]]), np.array([self.maximums[TARGET_COLUMN]])
+
+    def normalize(self, column, values):
+        return (values - self.minimums[column]) * self.scale(column)
+
+    def next_step(self, last, price):
+        """Timestep kế tiếp theo INPUT_COLUMNS từ giá dự đoán `price` (batch,), cho forecasting.forecast.
+
+        Giá được chuẩn hóa lại theo min/max của từng cột (high = +1%, low = -1%,
+        adj_close lấy bằng giá đóng cửa); volume và sentiment giữ nguyên `last`.
+        """
+        prices = {"open": price, "high": price * 1.01, "low": price * 0.99, "adj_close": price}
+        row = np.array(last, dtype=float)
+        for i, column in enumerate(INPUT_COLUMNS):
+            if column in prices:
+                row[:, i] = self.normalize(column, prices[column])
+            elif column == "symbol":
+                row[:, i] = SYMBOL_INDEX
+        return row
+
+
+def _raw_columns():
+    """Biểu thức SQL của giá trị thô theo SCALED_COLUMNS; thiếu thì là 0 như fillna(0) của notebook."""
+    return {
+        "open": func.coalesce(cast(Stocks.open, Float), 0.0),
+        "high": func.coalesce(cast(Stocks.high, Float), 0.0),
+        "low": func.coalesce(cast(Stocks.low, Float), 0.0),
+        "close": func.coalesce(cast(Stocks.close, Float), 0.0),
+        "adj_close": func.coalesce(cast(Stocks.adj_close, Float), 0.0),
+        "volume": func.coalesce(cast(Stocks.volume, Float), 0.0),
+        "positive": func.coalesce(cast(DailySentiment.positive, Float), 0.0),
+        "negative": func.coalesce(cast(DailySentiment.negative, Float), 0.0),
+    }
+
+
+def _with_sentiment(query):
+    return query.outerjoin(
+        DailySentiment,
+        and_(DailySentiment.company_id == Stocks.company_id, DailySentiment.date == Stocks.date)
+    )
+
+
+def fit_params(db):
+    """Tạo phiên bản tham số mới từ min/max toàn cục của stocks và daily_sentiment (chưa sẵn sàng)."""
+    raw = _raw_columns()
+    aggregates = [func.min(raw[c]) for c in SCALED_COLUMNS] + [func.max(raw[c]) for c in SCALED_COLUMNS]
+    row = db.execute(_with_sentiment(select(*aggregates).select_from(Stocks))).one()
+    if row[0] is None:
+        raise ValueError("stocks table is empty, nothing to fit")
+    n = len(SCALED_COLUMNS)
+    params = FeatureParams(
+        minimums=json.dumps(dict(zip(SCALED_COLUMNS, map(float, row[:n])))),
+        maximums=json.dumps(dict(zip(SCALED_COLUMNS, map(float, row[n:])))),
+        ready=False,
+    )
+    db.add(params)
+    db.flush()
+    return NormalizationParams.from_row(params)
+
+
+def get_params(db, version):
+    params = _params_cache.get(("version", version))
+    if params is None:
+        row = db.query(FeatureParams).filter(FeatureParams.version == version).first()
+        if row is None:
+            return None
+        params = NormalizationParams.from_row(row)
+        if params.ready:
+            _params_cache.set(("version", version), params)
+    return params
+
+
+def serving_params(db):
+    """Phiên bản dùng để phục vụ: FEATURE_VERSION hoặc phiên bản sẵn sàng mới nhất; None nếu chưa có."""
+    if FEATURE_VERSION:
+        return get_params(db, FEATURE_VERSION)
+    version = _params_cache.get("serving")
+    if version is None:
+        version = db.query(func.max(FeatureParams.version)).filter(FeatureParams.ready.is_(True)).scalar() or 0
+        _params_cache.set("serving", version)
+    return get_params(db, version) if version else None
+
+
+def target_versions(db):
+    """Các phiên bản cần cập nhật khi có dữ liệu mới: phiên bản đang phục vụ và các phiên bản mới hơn đang dựng."""
+    versions = _params_cache.get("targets")
+    if versions is None:
+        serving = serving_params(db)
+        floor = serving.version if serving else 0
+        versions = [v for (v,) in db.query(FeatureParams.version).filter(FeatureParams.version >= floor)]
+        _params_cache.set("targets", versions)
+    return versions
+
+
+def materialize(db, params, company_ids=None, start=None, end=None):
+    """Tính và ghi feature của một phiên bản cho các dòng stocks thỏa điều kiện, trong một câu lệnh."""
+    raw = _raw_columns()
+    columns = [params.normalize(c, raw[c]) for c in SCALED_COLUMNS]
+    query = _with_sentiment(select(
+        Stocks.company_id, Stocks.date, *columns
+    ).select_from(Stocks)).where(Stocks.company_id.isnot(None))
+    if company_ids is not None:
+        query = query.where(Stocks.company_id.in_(company_ids))
+    if start is not None:
+        query = query.where(Stocks.date >= start)
+    if end is not None:
+        query = query.where(Stocks.date <= end)
+    # Hằng số phiên bản đặt trong SELECT để INSERT ... SELECT chạy hoàn toàn trong database
+    query = query.add_columns(cast(params.version, StockFeatures.version.type))
+
+    insert = upsert_insert(db.get_bind())
+    stmt = insert(StockFeatures).from_select(
+        ["company_id", "date", *SCALED_COLUMNS, "version"], query
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[StockFeatures.version, StockFeatures.company_id, StockFeatures.date],
+        set_={c: stmt.excluded[c] for c in SCALED_COLUMNS},
+    )
+    db.execute(stmt)
+
+
+def materialize_features(db, company_ids, start=None, end=None):
+    """Cập nhật feature của các công ty trong [start, end] cho mọi phiên bản đang dùng; gọi sau khi ghi giá/tin tức,
+    trong cùng transaction. Không làm gì khi chưa có phiên bản nào."""
+    for version in target_versions(db):
+        params = get_params(db, version)
+        if params is not None:
+            materialize(db, params, company_ids, start, end)
+
+
+def read_window(db, company_id, params, length):
+    """(ngày, mảng (length, len(INPUT_COLUMNS))) của `length` phiên gần nhất, thiếu thì đệm 0 ở đầu."""
+    rows = db.query(
+        StockFeatures.date, *(getattr(StockFeatures, c) for c in SCALED_COLUMNS)
+    ).filter(
+        StockFeatures.version == params.version,
+        StockFeatures.company_id == company_id
+    ).order_by(StockFeatures.date.desc()).limit(length).all()[::-1]
+    scaled = np.array([row[1:] for row in rows], dtype=float).reshape(-1, len(SCALED_COLUMNS))
+    return [row[0] for row in rows], assemble_inputs(scaled, length)
+
+
+def assemble_inputs(scaled, length=None):
+    """Từ mảng (n, SCALED_COLUMNS) sang input GRU (length, INPUT_COLUMNS); đệm 0 ở đầu nếu n < length."""
+    length = length or len(scaled)
+    inputs = np.zeros((length, len(INPUT_COLUMNS)))
+    if len(scaled):
+        scaled = scaled[-length:]
+        for i, column in enumerate(INPUT_COLUMNS):
+            inputs[length - len(scaled):, i] = SYMBOL_INDEX if column == "symbol" else scaled[:, SCALED_COLUMNS.index(column)]
+    return inputs
+
+
+def fit(session_factory, batch_size=200, catch_up_days=30):
+    """Tạo phiên bản mới, tính feature cho toàn bộ stocks theo lô công ty rồi đánh dấu sẵn sàng.
+
+    Worker API chỉ thấy phiên bản mới sau tối đa FEATURE_PARAMS_CACHE_TTL giây, nên
+    `catch_up_days` ngày gần nhất được tính lại lần cuối để không sót dữ liệu vừa ghi.
+    """
+    db = session_factory()
+    try:
+        params = fit_params(db)
+        db.commit()
+        _params_cache.clear()
+        company_ids = [c for (c,) in db.query(Company.id).order_by(Company.id)]
+        for i in range(0, len(company_ids), batch_size):
+            materialize(db, params, company_ids[i:i + batch_size])
+            db.commit()
+            logger.info(f"Materialized version {params.version} for {min(i + batch_size, len(company_ids))}/{len(company_ids)} companies")
+        if catch_up_days:
+            materialize(db, params, start=date.today() - timedelta(days=catch_up_days))
+        db.query(FeatureParams).filter(FeatureParams.version == params.version).update({"ready": True})
+        db.commit()
+        _params_cache.clear()
+        return params
+    finally:
+        db.close()
+
+
+def export(session_factory, directory, version=None, batch_size=200):
+    """Xuất feature của một phiên bản ra .npy (đọc lại bằng memmap, xem load_export).
+
+    Các dòng theo thứ tự (company_id, date); `offsets` đánh dấu dòng đầu của từng công ty để cắt cửa sổ,
+    mã của từng công ty nằm trong `symbols` của meta.json.
+    """
+    db = session_factory()
+    try:
+        params = get_params(db, version) if version else serving_params(db)
+        if params is None:
+            raise ValueError("no ready feature version to export")
+        counts = db.query(StockFeatures.company_id, func.count()).filter(
+            StockFeatures.version == params.version
+        ).group_by(StockFeatures.company_id).order_by(StockFeatures.company_id).all()
+        total = sum(n for _, n in counts)
+
+        os.makedirs(directory, exist_ok=True)
+        open_memmap = np.lib.format.open_memmap
+        inputs = open_memmap(os.path.join(directory, "inputs.npy"), mode="w+", dtype=np.float32, shape=(total, len(INPUT_COLUMNS)))
+        target = open_memmap(os.path.join(directory, "target.npy"), mode="w+", dtype=np.float32, shape=(total,))
+        dates = open_memmap(os.path.join(directory, "dates.npy"), mode="w+", dtype="datetime64[D]", shape=(total,))
+        company = open_memmap(os.path.join(directory, "company_ids.npy"), mode="w+", dtype=np.int32, shape=(total,))
+
+        from storage import fetch_columns
+
+        row = 0
+        for i in range(0, len(counts), batch_size):
+            company_ids = [c for c, _ in counts[i:i + batch_size]]
+            columns = fetch_columns(db, select(
+                StockFeatures.company_id,
+                cast(StockFeatures.date, String),
+                *(getattr(StockFeatures, c) for c in SCALED_COLUMNS)
+            ).where(
+                StockFeatures.version == params.version,
+                StockFeatures.company_id.in_(company_ids)
+            ).order_by(StockFeatures.company_id, StockFeatures.date))
+            n = len(columns[0])
+            scaled = np.column_stack(columns[2:]).astype(np.float32)
+            inputs[row:row + n] = assemble_inputs(scaled)
+            target[row:row + n] = scaled[:, SCALED_COLUMNS.index(TARGET_COLUMN)]
+            dates[row:row + n] = np.asarray(columns[1], dtype="datetime64[D]")
+            company[row:row + n] = columns[0]
+            row += n
+        for array in (inputs, target, dates, company):
+            array.flush()
+
+        offsets = np.concatenate([[0], np.cumsum([n for _, n in counts])]).astype(np.int64)
+        np.save(os.path.join(directory, "offsets.npy"), offsets)
+        symbols = dict(db.query(Company.id, Company.symbol).filter(Company.id.in_([c for c, _ in counts])))
+        with open(os.path.join(directory, "meta.json"), "w") as f:
+            json.dump({
+                "version": params.version, "rows": total, "companies": len(counts),
+                "symbols": [symbols.get(c) for c, _ in counts],
+                "input_columns": INPUT_COLUMNS, "target_column": TARGET_COLUMN,
+                "minimums": params.minimums, "maximums": params.maximums,
+            }, f, indent=2)
+        return total
+    finally:
+        db.close()
+
+
+def load_export(directory):
+    """Mở bản xuất bằng memmap (không đọc cả file vào bộ nhớ); trả về dict mảng và meta."""
+    arrays = {
+        name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+        for name in ("inputs", "target", "dates", "company_ids", "offsets")
+    }
+    with open(os.path.join(directory, "meta.json")) as f:
+        arrays["meta"] = json.load(f)
+    return arrays
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Feature store cho model GRU")
+    sub = parser.add_subparsers(dest="command", required=True)
+    fit_parser = sub.add_parser("fit", help="Tạo phiên bản tham số mới và tính feature cho toàn bộ dữ liệu")
+    fit_parser.add_argument("--batch-size", type=int, default=200, help="Số công ty mỗi transaction")
+    sub.add_parser("status", help="Liệt kê các phiên bản")
+    exp = sub.add_parser("export", help="Xuất feature ra .npy cho huấn luyện")
+    exp.add_argument("--output", required=True)
+    exp.add_argument("--version", type=int, help="Mặc định: phiên bản đang phục vụ")
+    args = parser.parse_args()
+
+    from database import SessionLocal
+
+    if args.command == "fit":
+        started = time.perf_counter()
+        params = fit(SessionLocal, args.batch_size)
+        print(f"Feature version {params.version} ready in {time.perf_counter() - started:.1f}s")
+    elif args.command == "status":
+        db = SessionLocal()
+        try:
+            counts = dict(db.query(StockFeatures.version, func.count()).group_by(StockFeatures.version).all())
+            serving = serving_params(db)
+            for row in db.query(FeatureParams).order_by(FeatureParams.version):
+                marker = " (serving)" if serving and serving.version == row.version else ""
+                state = "ready" if row.ready else "building"
+                print(f"v{row.version}{marker}: {state}, {counts.get(row.version, 0)} rows, created {row.created_at}")
+        finally:
+            db.close()
+    else:
+        started = time.perf_counter()
+        total = export(SessionLocal, args.output, args.version)
+        print(f"Exported {total} rows to {args.output} in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# Xây dựng input và dự đoán tự hồi quy cho mô hình GRU.
+# Dùng chung cho endpoint /predict-using-gru và công cụ backtest.py để hai
+# nơi luôn cho cùng một kết quả với cùng dữ liệu.
+import os
+
+import numpy as np
+
+DEFAULT_MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "model_gru", "gru_model.keras")
+
+# Số ngày (lịch) dùng để lấy min/max chuẩn hóa giá
+PRICE_WINDOW_DAYS = 30
+# Số phiên dự đoán tiếp theo
+FORECAST_STEPS = 7
+
+# Thứ tự cột của mảng dữ liệu thô lấy từ bảng stocks
+RAW_COLUMNS = (
+    "open", "high", "low", "close", "volume",
+    "news_positive_sentiment", "news_negative_sentiment",
+)
+CLOSE = RAW_COLUMNS.index("close")
+
+
+def stocks_to_array(stocks) -> np.ndarray:
+    """Chuyển các dòng ORM `Stocks` thành mảng (n, 7) theo RAW_COLUMNS."""
+    return np.array([
+        [
+            float(s.open), float(s.high), float(s.low), float(s.close), float(s.volume),
+            s.news_positive_sentiment or 0, s.news_negative_sentiment or 0,
+        ]
+        for s in stocks
+    ], dtype=float).reshape(-1, len(RAW_COLUMNS))
+
+
+def build_sequences(raw: np.ndarray, price_min: np.ndarray, price_max: np.ndarray, n_features: int) -> np.ndarray:
+    """Tạo batch input (batch, seq_len, n_features) cho GRU.
+
+    `raw` có dạng (batch, seq_len, 7); giá OHLC được chuẩn hóa theo
+    min/max giá đóng cửa của từng cửa sổ, volume giữ nguyên như lúc phục vụ,
+    chỉ số mã luôn bằng 0.
+    """
+    scale = (price_max - price_min)[:, None, None]
+    sequences = np.zeros(raw.shape[:2] + (n_features,))
+    sequences[..., 0:4] = (raw[..., 0:4] - price_min[:, None, None]) / scale
+    sequences[..., 4] = raw[..., 4]
+    sequences[..., 5] = 0  # Symbol index
+    sequences[..., 6] = raw[..., 5]
+    sequences[..., 7] = raw[..., 6]
+    return sequences
+
+
+def forecast(predict, sequences: np.ndarray, price_min: np.ndarray, price_max: np.ndarray, steps: int = FORECAST_STEPS,
+             next_step=None) -> np.ndarray:
+    """Dự đoán tự hồi quy `steps` phiên cho cả batch.
+
+    `predict` nhận mảng (batch, seq_len, n_features) và trả về (batch, 1).
+    Sau mỗi bước, giá dự đoán được đưa vào timestep cuối của chuỗi
+    (high = +1%, low = -1%, volume và sentiment giữ nguyên bước trước).
+    `next_step(last, price)` dựng timestep đó từ timestep cuối (batch, n_features)
+    và giá gốc vừa dự đoán (batch,) khi input không theo layout của
+    build_sequences (vd. feature store, xem features.NormalizationParams.next_step).
+    Trả về giá gốc dạng (batch, steps).
+    """
+    scale = price_max - price_min
+    current = sequences
+    predictions = np.empty((len(sequences), steps))
+    for step in range(steps):
+        normalized_pred = np.asarray(predict(current)).reshape(len(current), -1)[:, 0]
+        predictions[:, step] = normalized_pred * scale + price_min
+
+        if next_step is not None:
+            next_features = next_step(current[:, -1], predictions[:, step])
+        else:
+            next_features = np.zeros((len(current), current.shape[2]))
+            next_features[:, 0] = normalized_pred  # Open
+            next_features[:, 1] = normalized_pred * 1.01  # High
+            next_features[:, 2] = normalized_pred * 0.99  # Low
+            next_features[:, 3] = normalized_pred  # Close
+            next_features[:, 4] = current[:, -1, 4]  # Volume
+            next_features[:, 5] = 0  # Symbol index
+            next_features[:, 6] = current[:, -1, 6]  # Sentiment positive
+            next_features[:, 7] = current[:, -1, 7]  # Sentiment negative
+
+        current = np.roll(current, -1, axis=1)
+        current[:, -1] = next_features
+    return predictions
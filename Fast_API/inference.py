@@ -0,0 +1,360 @@
+"""Tiến trình suy luận dùng chung (sidecar) cho nhiều worker API.
+
+Một tiến trình giữ model và phục vụ dự đoán qua socket cục bộ; các worker
+uvicorn chỉ là client mỏng (`RemoteBackend`, không import TensorFlow) nên bộ
+nhớ không tăng theo số worker. Các request đến trong lúc model đang chạy
+được gộp thành một batch ở lần gọi kế tiếp.
+
+Giao thức: mỗi frame gồm 1 byte mã lệnh/trạng thái, 4 byte độ dài và phần
+thân. Mảng được mã hóa float32 kèm shape. Transport chọn theo địa chỉ
+(`unix:///đường/dẫn.sock` hoặc `tcp://host:port`), đăng ký thêm bằng
+`register_transport`.
+
+Ví dụ (chạy trong thư mục Fast_API):
+    python inference.py serve --backend tflite --address unix:///tmp/gru_inference.sock
+    python inference.py health --address unix:///tmp/gru_inference.sock
+    MODEL_SERVER=unix:///tmp/gru_inference.sock uvicorn main:app --workers 4
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import signal
+import socket
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ADDRESS = "unix:///tmp/gru_inference.sock"
+
+OP_PREDICT = 1
+OP_HEALTH = 2
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+_HEADER = struct.Struct("!BI")
+
+
+def encode_array(array):
+    array = np.ascontiguousarray(array, dtype="<f4")
+    return struct.pack(f"!B{array.ndim}I", array.ndim, *array.shape) + array.tobytes()
+
+
+def decode_array(payload):
+    ndim = payload[0]
+    shape = struct.unpack_from(f"!{ndim}I", payload, 1)
+    return np.frombuffer(payload, dtype="<f4", offset=1 + 4 * ndim).reshape(shape)
+
+
+def _frame(code, payload=b""):
+    return _HEADER.pack(code, len(payload)) + payload
+
+
+class UnixTransport:
+    @staticmethod
+    def connect(target, timeout):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        sock.connect(target)
+        return sock
+
+    @staticmethod
+    async def start_server(handler, target):
+        # Xóa socket còn sót lại từ lần chạy trước
+        if os.path.exists(target):
+            os.unlink(target)
+        return await asyncio.start_unix_server(handler, path=target)
+
+    @staticmethod
+    def cleanup(target):
+        if os.path.exists(target):
+            os.unlink(target)
+
+
+class TCPTransport:
+    @staticmethod
+    def _split(target):
+        host, port = target.rsplit(":", 1)
+        return host, int(port)
+
+    @staticmethod
+    def connect(target, timeout):
+        sock = socket.create_connection(TCPTransport._split(target), timeout=timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+
+    @staticmethod
+    async def start_server(handler, target):
+        host, port = TCPTransport._split(target)
+        return await asyncio.start_server(handler, host=host, port=port)
+
+    @staticmethod
+    def cleanup(target):
+        pass
+
+
+TRANSPORTS = {"unix": UnixTransport, "tcp": TCPTransport}
+
+
+def register_transport(scheme, transport):
+    """Thêm transport mới; cần connect(target, timeout), start_server(handler, target) và cleanup(target)."""
+    TRANSPORTS[scheme] = transport
+
+
+def parse_address(address):
+    scheme, sep, target = address.partition("://")
+    if not sep or scheme not in TRANSPORTS:
+        raise ValueError(f"Unsupported inference address '{address}', expected one of {sorted(TRANSPORTS)}://...")
+    return TRANSPORTS[scheme], target
+
+
+def _recv_exactly(sock, size):
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        n = sock.recv_into(view[received:])
+        if n == 0:
+            raise ConnectionError("Inference server closed the connection")
+        received += n
+    return bytes(buffer)
+
+
+class RemoteBackend:
+    """Client của tiến trình suy luận, cùng giao diện `predict` với các backend trong model_serving.
+
+    Mỗi thread dùng một kết nối riêng; kết nối hỏng (server khởi động lại) được mở lại một lần.
+    """
+
+    name = "remote"
+
+    def __init__(self, address=DEFAULT_ADDRESS, timeout=30.0):
+        self.address = address
+        self.timeout = timeout
+        self._transport, self._target = parse_address(address)
+        self._local = threading.local()
+
+    def _close(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            sock.close()
+            self._local.sock = None
+
+    def _call(self, op, payload=b""):
+        for attempt in range(2):
+            try:
+                sock = getattr(self._local, "sock", None)
+                if sock is None:
+                    sock = self._local.sock = self._transport.connect(self._target, self.timeout)
+                sock.sendall(_frame(op, payload))
+                status, length = _HEADER.unpack(_recv_exactly(sock, _HEADER.size))
+                body = _recv_exactly(sock, length)
+                break
+            except OSError as e:
+                self._close()
+                if attempt:
+                    raise ConnectionError(f"Inference server at {self.address} is unavailable: {e}") from e
+        if status != STATUS_OK:
+            raise RuntimeError(f"Inference server error: {body.decode()}")
+        return body
+
+    def predict(self, batch):
+        return decode_array(self._call(OP_PREDICT, encode_array(batch)))
+
+    def health(self):
+        return json.loads(self._call(OP_HEALTH))
+
+
+class InferenceServer:
+    """Nhận request qua transport, gộp thành batch và chạy trên một backend duy nhất.
+
+    `input_shape` là (seq_len, n_features) của model; request khác shape bị từ chối
+    riêng lẻ trước khi vào hàng đợi, không làm hỏng cả batch.
+    """
+
+    def __init__(self, backend, input_shape, max_batch=512, max_wait=0.0):
+        self.backend = backend
+        self.input_shape = tuple(input_shape)
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.started = time.time()
+        self.requests = 0
+        self.rows = 0
+        self.batches = 0
+        self.errors = 0
+        self.rejected = 0
+        self._queue = None
+        # Backend chạy trong một thread riêng để event loop tiếp tục nhận request
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
+
+    def health(self):
+        return {
+            "status": "ok",
+            "pid": os.getpid(),
+            "backend": self.backend.name,
+            "uptime_s": round(time.time() - self.started, 1),
+            "requests": self.requests,
+            "batches": self.batches,
+            "mean_batch_rows": round(self.rows / self.batches, 2) if self.batches else 0.0,
+            "errors": self.errors,
+            "rejected": self.rejected,
+            "queued": self._queue.qsize() if self._queue else 0,
+        }
+
+    async def _handle(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                op, length = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+                payload = await reader.readexactly(length)
+                if op == OP_HEALTH:
+                    reply = _frame(STATUS_OK, json.dumps(self.health()).encode())
+                elif op == OP_PREDICT:
+                    try:
+                        batch = self._validate(payload)
+                    except ValueError as e:
+                        self.rejected += 1
+                        reply = _frame(STATUS_ERROR, str(e).encode())
+                    else:
+                        future = loop.create_future()
+                        self._queue.put_nowait((batch, future))
+                        try:
+                            reply = _frame(STATUS_OK, encode_array(await future))
+                        except Exception as e:
+                            reply = _frame(STATUS_ERROR, str(e).encode())
+                else:
+                    reply = _frame(STATUS_ERROR, f"Unknown op {op}".encode())
+                writer.write(reply)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def _validate(self, payload):
+        """Giải mã mảng và kiểm tra shape (batch, seq_len, n_features); ValueError nếu không hợp lệ."""
+        try:
+            batch = decode_array(payload)
+        except (struct.error, IndexError, ValueError) as e:
+            raise ValueError(f"Malformed input array: {e}") from e
+        if batch.ndim != 3 or batch.shape[1:] != self.input_shape or len(batch) == 0:
+            raise ValueError(f"Expected input of shape (batch, {self.input_shape[0]}, {self.input_shape[1]}), got {batch.shape}")
+        return batch
+
+    async def _batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            items = [await self._queue.get()]
+            rows = len(items[0][0])
+            deadline = loop.time() + self.max_wait
+            # Gộp các request đang chờ (đến trong lúc batch trước chạy), tối đa max_batch dòng
+            while rows < self.max_batch:
+                try:
+                    if self._queue.empty() and loop.time() < deadline:
+                        item = await asyncio.wait_for(self._queue.get(), deadline - loop.time())
+                    else:
+                        item = self._queue.get_nowait()
+                except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                    break
+                items.append(item)
+                rows += len(item[0])
+
+            self.requests += len(items)
+            self.rows += rows
+            self.batches += 1
+            try:
+                batch = items[0][0] if len(items) == 1 else np.concatenate([b for b, _ in items])
+                output = await loop.run_in_executor(self._executor, self.backend.predict, batch)
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Inference batch of {rows} rows failed: {e}")
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            offset = 0
+            for batch, future in items:
+                if not future.done():
+                    future.set_result(output[offset:offset + len(batch)])
+                offset += len(batch)
+
+    async def serve(self, address):
+        transport, target = parse_address(address)
+        self._queue = asyncio.Queue()
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+
+        server = await transport.start_server(self._handle, target)
+        batcher = asyncio.create_task(self._batch_loop())
+        logger.info(f"Inference server ({self.backend.name}) listening on {address}")
+        try:
+            await stop.wait()
+        finally:
+            server.close()
+            await server.wait_closed()
+            batcher.cancel()
+            transport.cleanup(target)
+            self._executor.shutdown(wait=False)
+            logger.info("Inference server stopped")
+
+
+def wait_until_healthy(address, timeout=60.0):
+    """Chờ tới khi server trả lời health check; trả về nội dung health."""
+    client = RemoteBackend(address, timeout=1.0)
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return client.health()
+        except ConnectionError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Tiến trình suy luận GRU dùng chung cho các worker API")
+    parser.add_argument("--address", default=os.getenv("MODEL_SERVER", DEFAULT_ADDRESS))
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    srv = sub.add_parser("serve", help="Nạp model và phục vụ dự đoán")
+    srv.add_argument("--backend", default=os.getenv("MODEL_BACKEND", "keras"))
+    srv.add_argument("--model", default=os.getenv("MODEL_PATH"), help="Artifact của backend (mặc định trong model_gru/)")
+    srv.add_argument("--sequence-length", type=int, default=int(os.getenv("SEQUENCE_LENGTH", "30")))
+    srv.add_argument("--n-features", type=int, default=int(os.getenv("N_FEATURES", "8")))
+    srv.add_argument("--num-threads", type=int, default=int(os.getenv("MODEL_NUM_THREADS", "0")) or None)
+    srv.add_argument("--max-batch", type=int, default=512, help="Số dòng tối đa mỗi batch")
+    srv.add_argument("--max-wait-ms", type=float, default=0.0, help="Chờ thêm request để gộp batch (0: chỉ gộp request đang chờ)")
+
+    chk = sub.add_parser("health", help="Kiểm tra server; thoát mã 1 nếu không trả lời")
+    chk.add_argument("--timeout", type=float, default=2.0)
+    args = parser.parse_args()
+
+    if args.command == "health":
+        try:
+            print(json.dumps(RemoteBackend(args.address, timeout=args.timeout).health()))
+        except (ConnectionError, RuntimeError) as e:
+            print(e, file=sys.stderr)
+            sys.exit(1)
+        return
+
+    from model_serving import load_backend, warm_up
+
+    shape = (args.sequence_length, args.n_features)
+    backend = load_backend(args.backend, args.model, *shape, args.num_threads)
+    batch_sizes = sorted({1, 8, 64, args.max_batch})
+    warm_up(backend, *shape, batch_sizes)
+    asyncio.run(InferenceServer(backend, shape, args.max_batch, args.max_wait_ms / 1000).serve(args.address))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+# Import trễ các thư viện nặng (yfinance, finnhub, TextBlob...): module chỉ được
+# nạp ở lần truy cập thuộc tính đầu tiên, nên worker khởi động nhanh và
+# endpoint không dùng tới thư viện thì không phải trả chi phí import/RAM.
+import importlib
+
+
+class LazyModule:
+    """Đại diện cho một module, import thật khi cần."""
+
+    def __init__(self, name):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+
+    def load(self):
+        module = self.__dict__["_module"]
+        if module is None:
+            # importlib đã có khóa theo module nên an toàn khi nhiều thread cùng gọi
+            module = importlib.import_module(self._name)
+            self.__dict__["_module"] = module
+        return module
+
+    @property
+    def loaded(self):
+        return self.__dict__["_module"] is not None
+
+    def __getattr__(self, attr):
+        return getattr(self.load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self.loaded else "not loaded"
+        return f"<lazy module '{self._name}' ({state})>"
+
+
+def lazy_import(name):
+    return LazyModule(name)
@@ -1,44 +1,60 @@
 # Python Standard Library
+import asyncio
 import json
 import logging
 import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
 from typing import List, Optional
 
-# Data Processing & Machine Learning
+# Data Processing
 import numpy as np
-import pandas as pd
-from sklearn.preprocessing import MinMaxScaler
-import tensorflow as tf
-from tensorflow.keras.models import load_model
-from textblob import TextBlob
 
 # FastAPI & Web
 from fastapi import FastAPI, HTTPException, Depends, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from pydantic import BaseModel
 
 # Database & ORM
-from sqlalchemy import (
-    Column, Integer, String, Float, DateTime, Date, Text, 
-    ForeignKey, DECIMAL, create_engine, func, case, text
-)
-from sqlalchemy.dialects.postgresql import TIMESTAMP
-from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy import Float, String, and_, cast, func, select, text
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import relationship, sessionmaker, Session
+from sqlalchemy.orm import Session
+from database import (
+    Company, DailySentiment, News, SessionLocal, Sector, Stocks, User, UserWatchlist, get_db
+)
+from storage import add_daily_sentiment, daily_sentiment_counts, fetch_columns
 
 # Authentication & Security
 import jwt
 from passlib.context import CryptContext
 
 # Third Party APIs & Services
-import finnhub
-import yfinance as yf
 import requests
+from lazy import LazyModule, lazy_import
+
+# yfinance, finnhub và TextBlob chỉ được import ở lần dùng đầu tiên
+finnhub = lazy_import("finnhub")
+yf = lazy_import("yfinance")
+textblob = lazy_import("textblob")
+
+# Internal modules
+from cache import TTLCache
+from downsampling import lttb_indices
+from features import materialize_features, read_window, serving_params
+from panel import sector_analytics
+from telemetry import MetricsMiddleware, render_metrics, stage
+from forecasting import (
+    FORECAST_STEPS, PRICE_WINDOW_DAYS,
+    build_sequences, forecast, stocks_to_array
+)
+from model_serving import default_artifact, load_backend, warm_up
+from inference import RemoteBackend
 
 # Logging Configuration
 from fastapi.logger import logger as fastapi_logger
@@ -57,116 +73,102 @@ logger = logging.getLogger(__name__)
 fastapi_logger.handlers = logger.handlers
 fastapi_logger.setLevel(logging.INFO) 
 
-# FastAPI app initialization
-app = FastAPI()
-
-# CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# Database configuration
-SQLALCHEMY_DATABASE_URL = f"postgresql://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}/{os.getenv('DB_NAME')}"
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
-
 # JWT Configuration
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"))
 
+# Cache token đã xác thực: mỗi mục sống tối đa AUTH_TOKEN_CACHE_TTL giây và không quá exp của token
+AUTH_TOKEN_CACHE_TTL = int(os.getenv("AUTH_TOKEN_CACHE_TTL", "300"))
+token_cache = TTLCache(maxsize=int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000")), ttl=AUTH_TOKEN_CACHE_TTL)
+
+# bcrypt chạy trong pool thread giới hạn để đăng nhập dồn dập không chặn event loop
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+
 # Cấu hình NewsAPI
 NEWS_API_KEY = os.getenv("NEWS_API_KEY")
 NEWS_API_URL = "https://newsapi.org/v2/everything"
 
-# Load GRU model
-model_gru = load_model('model\\gru_model.keras')
 SEQUENCE_LENGTH = int(os.getenv("SEQUENCE_LENGTH")) # Định nghĩa các hằng số cho GRU model
 N_FEATURES = int(os.getenv("N_FEATURES"))
 
+# GRU model: MODEL_BACKEND là keras (mặc định), savedmodel hoặc tflite,
+# MODEL_PATH trỏ tới artifact tương ứng (xuất bằng model_serving.py export).
+# Model được nạp ở request dự đoán đầu tiên; đặt MODEL_PRELOAD=1 để nạp và
+# warm-up ngay khi worker khởi động (cho các worker phục vụ dự đoán).
+# Khi có MODEL_SERVER (vd. unix:///tmp/gru_inference.sock), worker không nạp
+# model mà gửi dự đoán tới tiến trình suy luận dùng chung (inference.py).
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "keras")
+MODEL_PATH = os.getenv("MODEL_PATH", default_artifact(MODEL_BACKEND))
+MODEL_NUM_THREADS = int(os.getenv("MODEL_NUM_THREADS", "0")) or None
+MODEL_WARMUP_BATCH_SIZES = [int(b) for b in os.getenv("MODEL_WARMUP_BATCH_SIZES", "1").split(",") if b]
+MODEL_PRELOAD = os.getenv("MODEL_PRELOAD", "0") == "1"
+MODEL_SERVER = os.getenv("MODEL_SERVER")
+model_gru = None
+_model_lock = threading.Lock()
+
+def get_model():
+    """Nạp backend GRU một lần cho mỗi worker (an toàn khi nhiều thread cùng gọi)."""
+    global model_gru
+    if model_gru is None:
+        with _model_lock:
+            if model_gru is None and MODEL_SERVER:
+                model_gru = RemoteBackend(MODEL_SERVER)
+            elif model_gru is None:
+                backend = load_backend(MODEL_BACKEND, MODEL_PATH, SEQUENCE_LENGTH, N_FEATURES, MODEL_NUM_THREADS)
+                warm_up(backend, SEQUENCE_LENGTH, N_FEATURES, MODEL_WARMUP_BATCH_SIZES)
+                model_gru = backend
+    return model_gru
+
+def preload():
+    """Nạp trước model và các thư viện của luồng dự đoán."""
+    model = get_model()
+    if isinstance(model, RemoteBackend):
+        try:
+            logger.info(f"Inference server at {MODEL_SERVER}: {model.health()}")
+        except ConnectionError as e:
+            # Sidecar có thể khởi động sau, client sẽ kết nối lại ở request đầu tiên
+            logger.warning(str(e))
+    for module in (yf, textblob):
+        if isinstance(module, LazyModule):
+            module.load()
+
+@asynccontextmanager
+async def lifespan(app):
+    if MODEL_PRELOAD:
+        await run_in_threadpool(preload)
+    yield
+
 # Thêm hằng số cho API key
 FINNHUB_API_KEY = os.getenv("FINNHUB_API_KEY")
 
 # Thêm hằng số cho API key 
 ALPHA_VANTAGE_API_KEY_DEMO = os.getenv("ALPHA_VANTAGE_API_KEY_DEMO")
 
-# Khởi tạo MinMaxScaler
-scaler = MinMaxScaler(feature_range=(0, 1))
-
-# Database Models
-class User(Base):
-    __tablename__ = "users" 
-    id = Column(Integer, primary_key=True, index=True)
-    email = Column(String(255), unique=True, index=True)
-    hashed_password = Column(String(255))
-
-    # Sử dụng quan hệ để lấy dữ liệu từ bảng UserWatchlist
-    watchlist_items = relationship("UserWatchlist", back_populates="user", cascade="all, delete-orphan")
-
-class Sector(Base):
-    __tablename__ = "sectors"
-    id = Column(Integer, primary_key=True, index=True)
-    name = Column(String(100), unique=True, index=True)
-
-    companies = relationship("Company", back_populates="sector")
-
-class Company(Base):
-    __tablename__ = "companies"
-    id = Column(Integer, primary_key=True, index=True)
-    name = Column(String(255), nullable=False)
-    symbol = Column(String(10), unique=True, nullable=False)
-    sector_id = Column(Integer, ForeignKey("sectors.id"))
-    description = Column(Text, nullable=True)
-
-    sector = relationship("Sector", back_populates="companies")  # Quan hệ với bảng Sector
-    stocks = relationship("Stocks", back_populates="company")
-    news = relationship("News", back_populates="company")
-
-class Stocks(Base):
-    __tablename__ = "stocks" 
-    id = Column(Integer, primary_key=True)
-    date = Column(Date, nullable=False)
-    company_id = Column(Integer, ForeignKey("companies.id"))
-    open = Column(DECIMAL(10, 2), nullable=True)
-    high = Column(DECIMAL(10, 2), nullable=True)
-    low = Column(DECIMAL(10, 2), nullable=True)
-    close = Column(DECIMAL(10, 2), nullable=True)
-    volume = Column(Integer, nullable=True)
-    adj_close = Column(DECIMAL(10, 2), nullable=True)
-    news_positive_sentiment = Column(Integer, nullable=True)
-    news_negative_sentiment = Column(Integer, nullable=True)
-    company = relationship("Company", back_populates="stocks")
-
-class News(Base):
-    __tablename__ = "news"
-    id = Column(Integer, primary_key=True)
-    date = Column(Date, nullable=False)
-    company_id = Column(Integer, ForeignKey("companies.id"))
-    source = Column(String(255), nullable=True)
-    name = Column(String(255), nullable=True)
-    title = Column(Text, nullable=False)
-    description = Column(Text, nullable=True)
-    url = Column(Text, nullable=True)
-    urltoimage = Column(Text, nullable=True)  # Changed from urlToImage to urltoimage
-    publishedat = Column(TIMESTAMP, nullable=True)  # Changed from publishedAt to publishedat
-    content = Column(Text, nullable=True)
-    sentiment = Column(Integer,nullable=True) # thêm sentiment
-    
-    company = relationship("Company", back_populates="news")
+# Cache kết quả /market-info theo (symbol, period, interval, max_points)
+MARKET_INFO_CACHE_TTL = int(os.getenv("MARKET_INFO_CACHE_TTL", "60"))
+market_info_cache = TTLCache(maxsize=512, ttl=MARKET_INFO_CACHE_TTL)
+
+# Cache /sector-analytics: hợp lệ tới khi bảng stocks có dòng mới (id lớn nhất thay đổi);
+# TTL giới hạn độ trễ cập nhật của sentiment
+SECTOR_ANALYTICS_CACHE_TTL = int(os.getenv("SECTOR_ANALYTICS_CACHE_TTL", "3600"))
+sector_analytics_cache = TTLCache(maxsize=64, ttl=SECTOR_ANALYTICS_CACHE_TTL)
 
-class UserWatchlist(Base):
-    __tablename__ = "userwatchlist"
-    id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
-    company_id = Column(Integer, ForeignKey("companies.id", ondelete="CASCADE"))
-    # Thiết lập mối quan hệ với bảng User và Company
-    user = relationship("User", back_populates="watchlist_items")
-    company = relationship("Company")
+# FastAPI app initialization
+app = FastAPI(lifespan=lifespan)
+
+# CORS middleware
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+# Đo độ trễ, số câu SQL và số lần gọi dịch vụ ngoài theo endpoint (xem /metrics)
+app.add_middleware(MetricsMiddleware)
 
 # Pydantic Models
 class UserCreate(BaseModel):
@@ -185,6 +187,10 @@ class StockPrediction(BaseModel):
     predictions: List[float]
     dates: List[str]
 
+class CurrentUser(BaseModel):
+    id: int
+    email: str
+
 # Authentication
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
@@ -195,16 +201,34 @@ def create_access_token(data: dict):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme)):
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> CurrentUser:
+    user = token_cache.get(token)
+    if user is not None:
+        return user
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise HTTPException(status_code=401)
-        return email
-    except jwt.JWTError:
+    except jwt.PyJWTError:
+        raise HTTPException(status_code=401)
+    email: str = payload.get("sub")
+    if email is None:
         raise HTTPException(status_code=401)
 
+    user_id = payload.get("uid")
+    if user_id is None:
+        # Token cũ chưa có uid: tra id một lần rồi cache như token mới
+        db = SessionLocal()
+        try:
+            user_id = db.query(User.id).filter(User.email == email).scalar()
+        finally:
+            db.close()
+        if user_id is None:
+            raise HTTPException(status_code=401)
+
+    user = CurrentUser(id=user_id, email=email)
+    expires_at = min(time.time() + AUTH_TOKEN_CACHE_TTL, payload["exp"]) if "exp" in payload else None
+    token_cache.set(token, user, expires_at)
+    return user
+
 # Password hashing setup
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -214,35 +238,41 @@ def hash_password(password: str):
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
+async def run_password_hash(func, *args):
+    """Chạy hash/verify bcrypt trong password_executor."""
+    loop = asyncio.get_running_loop()
+    with stage("password_hash"):
+        return await loop.run_in_executor(password_executor, func, *args)
+
 #Endpoint
 @app.post("/register")
-async def register(user: UserCreate):
-    db = SessionLocal()
+async def register(user: UserCreate, db: Session = Depends(get_db)):
     if db.query(User).filter(User.email == user.email).first():
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    hashed_password = hash_password(user.password)
+    hashed_password = await run_password_hash(hash_password, user.password)
     db_user = User(email=user.email, hashed_password=hashed_password)
     db.add(db_user)
     db.commit()
     return {"message": "User created successfully"}
 
 @app.post("/token")
-async def login(form_data: OAuth2PasswordRequestForm = Depends()):
-    db = SessionLocal()
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     user = db.query(User).filter(User.email == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    if not user or not await run_password_hash(verify_password, form_data.password, user.hashed_password):
         raise HTTPException(status_code=400, detail="Incorrect email or password")
     
-    access_token = create_access_token({"sub": user.email})
+    access_token = create_access_token({"sub": user.email, "uid": user.id})
     return {"access_token": access_token, "token_type": "bearer"}
 
 @app.get("/market-info/{symbol}")
-async def get_market_info(symbol: str, period: str = "1d", interval: str = "1m"):
+async def get_market_info(
+    symbol: str,
+    period: str = "1d",
+    interval: str = "1m",
+    max_points: Optional[int] = Query(None, ge=3),
+):
     try:
-        stock = yf.Ticker(symbol)
-        info = stock.info
-        
         # Định nghĩa các khoảng thời gian và interval tương ứng
         period_intervals = {
             "1d": "1m",
@@ -256,9 +286,19 @@ async def get_market_info(symbol: str, period: str = "1d", interval: str = "1m")
         
         # Sử dụng interval được định nghĩa hoặc mặc định theo period
         interval_to_use = period_intervals.get(period, interval)
+
+        cache_key = (symbol, period, interval_to_use, max_points)
+        cached = market_info_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        stock = yf.Ticker(symbol)
+        with stage("yf_info", upstream="yfinance"):
+            info = stock.info
         
         # Lấy dữ liệu lịch sử
-        data = stock.history(period=period, interval=interval_to_use)
+        with stage("yf_history", upstream="yfinance"):
+            data = stock.history(period=period, interval=interval_to_use)
         
         if data.empty:
             return {"error": "No data found for symbol"}
@@ -270,12 +310,15 @@ async def get_market_info(symbol: str, period: str = "1d", interval: str = "1m")
         price_change = latest_data["Close"] - first_data["Open"]
         price_change_percent = (price_change / first_data["Open"]) * 100
         
-        # Lấy giá đóng cửa để vẽ biểu đồ
-        price_history = data['Close'].tolist()
-        timestamps = [idx.strftime('%Y-%m-%d %H:%M:%S') for idx in data.index]
+        # Lấy giá đóng cửa để vẽ biểu đồ, giảm số điểm nếu có max_points
+        close = data['Close'].to_numpy()
+        keep = lttb_indices(close, max_points)
+        price_history = close[keep].tolist()
+        timestamps = [idx.strftime('%Y-%m-%d %H:%M:%S') for idx in data.index[keep]]
         
         # Lấy khối lượng trung bình 3 tháng
-        three_month_data = stock.history(period="3mo")
+        with stage("yf_history", upstream="yfinance"):
+            three_month_data = stock.history(period="3mo")
         avg_volume_3m = int(three_month_data['Volume'].mean())
         
         # Format market cap
@@ -285,7 +328,7 @@ async def get_market_info(symbol: str, period: str = "1d", interval: str = "1m")
         else:
             market_cap_str = f"{market_cap/1e9:.3f}B"
             
-        return {
+        result = {
             "symbol": symbol,
             "name": info.get('longName', 'N/A'),
             "price": round(latest_data["Close"], 4),
@@ -299,17 +342,19 @@ async def get_market_info(symbol: str, period: str = "1d", interval: str = "1m")
             "period": period,
             "interval": interval_to_use
         }
+        market_info_cache.set(cache_key, result)
+        return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # Watchlist không có tên công ty
 @app.get("/watchlist", response_model=List[str])
-async def get_watchlist(current_user: str = Depends(get_current_user)):
-    db = SessionLocal()
-    user = db.query(User).filter(User.email == current_user).first()
+async def get_watchlist(current_user: CurrentUser = Depends(get_current_user), db: Session = Depends(get_db)):
     # Lấy danh sách `symbol` từ các mục trong `watchlist`
-    watchlist_symbols = [item.company.symbol for item in user.watchlist_items]
-    return watchlist_symbols
+    rows = db.query(Company.symbol).join(UserWatchlist, UserWatchlist.company_id == Company.id).filter(
+        UserWatchlist.user_id == current_user.id
+    ).order_by(UserWatchlist.id).all()
+    return [row.symbol for row in rows]
 
 #Lấy thông tin công ty
 async def get_company_info(ticker):
@@ -329,10 +374,8 @@ async def get_company_info(ticker):
 
 # ...existing code...
 @app.put("/watchlist") 
-async def update_watchlist(watchlist: WatchlistUpdate, current_user: str = Depends(get_current_user)):
-    db = SessionLocal()
-    user = db.query(User).filter(User.email == current_user).first()
-    db.query(UserWatchlist).filter(UserWatchlist.user_id == user.id).delete()
+async def update_watchlist(watchlist: WatchlistUpdate, current_user: CurrentUser = Depends(get_current_user), db: Session = Depends(get_db)):
+    db.query(UserWatchlist).filter(UserWatchlist.user_id == current_user.id).delete()
     
     for symbol in watchlist.symbols:
         company = db.query(Company).filter(Company.symbol == symbol).first()
@@ -340,7 +383,8 @@ async def update_watchlist(watchlist: WatchlistUpdate, current_user: str = Depen
         if not company:
             try:
                 ticker = yf.Ticker(symbol)
-                info = ticker.info
+                with stage("yf_info", upstream="yfinance"):
+                    info = ticker.info
                 
                 company_name = info.get('longName')
                 sector_name = info.get('sector')
@@ -368,7 +412,7 @@ async def update_watchlist(watchlist: WatchlistUpdate, current_user: str = Depen
                 logger.error(f"Error processing {symbol}: {e}")
                 continue
 
-        watchlist_item = UserWatchlist(user_id=user.id, company_id=company.id)
+        watchlist_item = UserWatchlist(user_id=current_user.id, company_id=company.id)
         db.add(watchlist_item)
 
     db.commit()
@@ -377,25 +421,12 @@ async def update_watchlist(watchlist: WatchlistUpdate, current_user: str = Depen
 # Lấy danh sách mã chứng khoán trong watchlist
 # Watchlist có tên công ty 
 @app.get("/watchlist_name", response_model=List[dict])
-async def get_watchlist(current_user: str = Depends(get_current_user)):
-    db = SessionLocal()
-    user = db.query(User).filter(User.email == current_user).first()
-    
+async def get_watchlist(current_user: CurrentUser = Depends(get_current_user), db: Session = Depends(get_db)):
     # Lấy danh sách `symbol` và `name` từ các mục trong `watchlist`
-    watchlist_items = [
-        {"symbol": item.company.symbol, "name": item.company.name} 
-        for item in user.watchlist_items
-    ]
-    return watchlist_items
-
-# Hàm get_db đ quản lý database session 
-def get_db():
-    """Tạo và quản lý database session"""
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+    rows = db.query(Company.symbol, Company.name).join(UserWatchlist, UserWatchlist.company_id == Company.id).filter(
+        UserWatchlist.user_id == current_user.id
+    ).order_by(UserWatchlist.id).all()
+    return [{"symbol": row.symbol, "name": row.name} for row in rows]
 
 # Dự đoán giá cổ phiếu sử dụng GRU
 @app.get("/predict-using-gru/{symbol}")
@@ -409,7 +440,8 @@ async def predict_using_gru(symbol: str, db: Session = Depends(get_db)):
         # Lấy dữ liệu lịch sử từ yfinance
         end_date = datetime.now()
         start_date = end_date - timedelta(days=30)
-        stock_data = yf.download(symbol, start=start_date, end=end_date)
+        with stage("yf_download", upstream="yfinance"):
+            stock_data = yf.download(symbol, start=start_date, end=end_date)
 
         # Cập nhật dữ liệu vào bảng stocks nếu thiếu
         for date, row in stock_data.iterrows():
@@ -431,13 +463,11 @@ async def predict_using_gru(symbol: str, db: Session = Depends(get_db)):
                 )
                 db.add(stock)
 
-        # Kiểm tra và cập nhật tin tức
+        # Kiểm tra và cập nhật tin tức (số tin mỗi ngày lấy từ bảng daily_sentiment)
         dates_to_check = [(end_date - timedelta(days=x)).date() for x in range(30)]
+        counts = daily_sentiment_counts(db, company.id, dates_to_check[-1], dates_to_check[0])
         for date in dates_to_check:
-            news_count = db.query(News).filter(
-                News.date == date,
-                News.company_id == company.id
-            ).count()
+            news_count = sum(counts.get(date, (0, 0)))
             
             if news_count < 90:
                 params = {
@@ -449,8 +479,9 @@ async def predict_using_gru(symbol: str, db: Session = Depends(get_db)):
                     'pageSize': 100
                 }
                 
-                response = requests.get(NEWS_API_URL, params=params)
-                articles = response.json().get('articles', [])
+                with stage("news_fetch", upstream="newsapi"):
+                    response = requests.get(NEWS_API_URL, params=params)
+                    articles = response.json().get('articles', [])
                 
                 for article in articles:
                     try:
@@ -470,7 +501,8 @@ async def predict_using_gru(symbol: str, db: Session = Depends(get_db)):
                         # Chỉ thêm tin tức mới nếu chưa tồn tại
                         if not existing_news:
                             text = f"{article.get('title', '')} {article.get('description', '')} {article.get('content', '')}"
-                            sentiment = 1 if TextBlob(text).sentiment.polarity > 0 else -1
+                            with stage("sentiment"):
+                                sentiment = 1 if textblob.TextBlob(text).sentiment.polarity > 0 else -1
                             news = News(
                                 date=date,
                                 company_id=company.id,
@@ -484,6 +516,7 @@ async def predict_using_gru(symbol: str, db: Session = Depends(get_db)):
                                 sentiment=sentiment
                             )
                             db.add(news)
+                            add_daily_sentiment(db, company.id, date, int(sentiment == 1), int(sentiment == -1))
                             try:
                                 db.commit()
                                 news_count += 1
@@ -499,93 +532,65 @@ async def predict_using_gru(symbol: str, db: Session = Depends(get_db)):
 
         db.commit()
 
-        # Cập nhật sentiment counts vào bảng stocks 
-        for date in dates_to_check:
-            sentiment_counts = db.query(
-                func.sum(case((News.sentiment == 1, 1), else_=0)).label('positive'),
-                func.sum(case((News.sentiment == -1, 1), else_=0)).label('negative')
-            ).filter(
-                News.company_id == company.id,
-                News.date == date
-            ).first()
-
-            stock = db.query(Stocks).filter(
-                Stocks.date == date,
-                Stocks.company_id == company.id
-            ).first()
-
-            if stock:
-                stock.news_positive_sentiment = sentiment_counts.positive or 0
-                stock.news_negative_sentiment = sentiment_counts.negative or 0
-
-        db.commit()
-
-        # Lấy dữ liệu để dự đoán
+        # Lấy dữ liệu để dự đoán và cập nhật sentiment counts vào bảng stocks
         stock_data = db.query(Stocks).filter(
             Stocks.company_id == company.id,
             Stocks.date >= start_date.date(),
             Stocks.date <= end_date.date()
         ).order_by(Stocks.date).all()
 
+        with stage("sentiment_rollup"):
+            counts = daily_sentiment_counts(db, company.id, start_date.date(), end_date.date())
+            for stock in stock_data:
+                positive, negative = counts.get(stock.date, (0, 0))
+                stock.news_positive_sentiment = positive
+                stock.news_negative_sentiment = negative
+
+            db.commit()
+
+        # Cập nhật feature store cho các phiên vừa thu thập
+        with stage("feature_materialize"):
+            materialize_features(db, [company.id], start_date.date(), end_date.date())
+            db.commit()
+
         # Chuẩn bị dữ liệu cho dự đoán
-        close_prices = [float(s.close) for s in stock_data[-30:]]
-        historical_dates = [s.date.strftime('%Y-%m-%d') for s in stock_data[-30:]]
-        
-        price_min = min(close_prices)
-        price_max = max(close_prices)
-        
-        # Chuẩn bị sequence cho dự đoán
-        current_sequence = np.zeros((1, SEQUENCE_LENGTH, N_FEATURES))
-        
-        # Lấy 30 ngày dữ liệu gần nhất
-        recent_stocks = stock_data[-SEQUENCE_LENGTH:]
-        
-        # Điền dữ liệu vào sequence
-        for i, stock in enumerate(recent_stocks):
-            current_sequence[0, i, 0] = (float(stock.open) - price_min) / (price_max - price_min)
-            current_sequence[0, i, 1] = (float(stock.high) - price_min) / (price_max - price_min)
-            current_sequence[0, i, 2] = (float(stock.low) - price_min) / (price_max - price_min)
-            current_sequence[0, i, 3] = (float(stock.close) - price_min) / (price_max - price_min)
-            current_sequence[0, i, 4] = float(stock.volume)
-            current_sequence[0, i, 5] = 0  # Symbol index
-            current_sequence[0, i, 6] = stock.news_positive_sentiment or 0
-            current_sequence[0, i, 7] = stock.news_negative_sentiment or 0
-
-        predictions = []
+        raw = stocks_to_array(stock_data)
+        close_prices = raw[-PRICE_WINDOW_DAYS:, 3].tolist()
+        historical_dates = [s.date.strftime('%Y-%m-%d') for s in stock_data[-PRICE_WINDOW_DAYS:]]
+
+        params = serving_params(db)
+        if params is not None:
+            # Cửa sổ SEQUENCE_LENGTH phiên đã chuẩn hóa như lúc huấn luyện, đọc sẵn từ feature store
+            with stage("feature_fetch"):
+                _, window = read_window(db, company.id, params, SEQUENCE_LENGTH)
+            current_sequence = window[None]
+            price_min, price_max = params.price_range()
+            next_step = params.next_step
+        else:
+            # Chưa có phiên bản feature nào (chưa chạy `python features.py fit`): chuẩn hóa theo 30 ngày gần nhất
+            price_min = np.array([min(close_prices)])
+            price_max = np.array([max(close_prices)])
+
+            # Chuẩn bị sequence cho dự đoán từ SEQUENCE_LENGTH ngày gần nhất
+            current_sequence = np.zeros((1, SEQUENCE_LENGTH, N_FEATURES))
+            recent_stocks = raw[-SEQUENCE_LENGTH:]
+            current_sequence[:, :len(recent_stocks)] = build_sequences(recent_stocks[None], price_min, price_max, N_FEATURES)
+            next_step = None
+
+        # Dự đoán tự hồi quy 7 phiên bằng model GRU
+        # Lần đầu trong worker: nạp model trong threadpool để không chặn event loop
+        model = model_gru or await run_in_threadpool(get_model)
+        # predict chặn (model trong tiến trình hoặc chờ socket của sidecar) nên chạy trong threadpool
+        with stage("model_predict"):
+            predictions = (await run_in_threadpool(
+                forecast, model.predict,
+                current_sequence, price_min, price_max, FORECAST_STEPS, next_step
+            ))[0].tolist()
+
+        # Tạo ngày tiếp theo (bỏ qua cuối tuần)
         prediction_dates = []
         current_date = stock_data[-1].date
-
-        for _ in range(7):
-            # Dự đoán sử dụng model GRU
-            pred = model_gru.predict(current_sequence, verbose=0)
-            
-            # Chuyển đổi về giá gốc
-            predicted_value = pred[0][0]
-            original_price = predicted_value * (price_max - price_min) + price_min
-            predictions.append(float(original_price))
-
-            # Cập nhật sequence cho lần dự đoán tiếp theo
-            next_sequence = np.roll(current_sequence, -1, axis=1)
-            
-            # Chuẩn hóa giá trị dự đoán
-            normalized_pred = (original_price - price_min) / (price_max - price_min)
-            
-            # Cập nhật features cho timestep cuối cùng
-            next_features = np.zeros(N_FEATURES)
-            next_features[0] = normalized_pred  # Open
-            next_features[1] = normalized_pred * 1.01  # High
-            next_features[2] = normalized_pred * 0.99  # Low
-            next_features[3] = normalized_pred  # Close
-            next_features[4] = current_sequence[0, -1, 4]  # Volume
-            next_features[5] = 0  # Symbol index
-            next_features[6] = current_sequence[0, -1, 6]  # Sentiment positive
-            next_features[7] = current_sequence[0, -1, 7]  # Sentiment negative
-
-            # Cập nhật timestep cuối cùng
-            next_sequence[0, -1] = next_features
-            current_sequence = next_sequence
-
-            # Tạo ngày tiếp theo (bỏ qua cuối tuần)
+        for _ in range(FORECAST_STEPS):
             current_date = current_date + timedelta(days=1)
             while current_date.weekday() > 4:
                 current_date = current_date + timedelta(days=1)
@@ -633,14 +638,15 @@ async def get_news_sentiment(symbol: str, days_ago: int, db: Session = Depends(g
             dates_to_check.append(current_date)
             current_date += timedelta(days=1)
 
+        # Số tin hiện có theo ngày từ bảng daily_sentiment
+        counts = daily_sentiment_counts(db, company.id, start_date, end_date)
+        total_added = 0
+
         # Thu thập tin tức cho tất cả các ngày
         for date in dates_to_check:
             try:
                 # Đếm số lượng tin tức hiện có
-                existing_count = db.query(News).filter(
-                    News.date == date,
-                    News.company_id == company.id
-                ).count()
+                existing_count = sum(counts.get(date, (0, 0)))
 
                 if existing_count >= 90:
                     logger.info(f"Already have {existing_count} articles for {symbol} on {date}")
@@ -658,12 +664,14 @@ async def get_news_sentiment(symbol: str, days_ago: int, db: Session = Depends(g
                     'pageSize': 100
                 }
 
-                response = requests.get(NEWS_API_URL, params=params)
+                with stage("news_fetch", upstream="newsapi"):
+                    response = requests.get(NEWS_API_URL, params=params)
                 if response.status_code != 200:
                     logger.error(f"Failed to fetch news for {symbol} on {date}: {response.status_code}")
                     continue
 
-                articles = response.json().get('articles', [])
+                with stage("news_fetch"):
+                    articles = response.json().get('articles', [])
                 articles_added = 0
 
                 for article in articles:
@@ -683,7 +691,8 @@ async def get_news_sentiment(symbol: str, days_ago: int, db: Session = Depends(g
                     if not existing_news:
                         try:
                             text = f"{article.get('title', '')} {article.get('description', '')} {article.get('content', '')}"
-                            sentiment = 1 if TextBlob(text).sentiment.polarity > 0 else -1
+                            with stage("sentiment"):
+                                sentiment = 1 if textblob.TextBlob(text).sentiment.polarity > 0 else -1
                             news = News(
                                 date=date,
                                 company_id=company.id,
@@ -697,6 +706,7 @@ async def get_news_sentiment(symbol: str, days_ago: int, db: Session = Depends(g
                                 sentiment=sentiment
                             )
                             db.add(news)
+                            add_daily_sentiment(db, company.id, date, int(sentiment == 1), int(sentiment == -1))
                             db.commit()
                             articles_added += 1
                         except IntegrityError:
@@ -708,21 +718,25 @@ async def get_news_sentiment(symbol: str, days_ago: int, db: Session = Depends(g
                             continue
 
                 logger.info(f"Added {articles_added} new articles for {symbol} on {date}")
+                total_added += articles_added
 
             except Exception as e:
                 logger.error(f"Error processing news for {symbol} on {date}: {str(e)}")
                 continue
 
-        # Lấy thống kê sentiment
-        sentiment_stats = db.query(
-            News.date,
-            func.count(case([(News.sentiment == 1, 1)])).label('positive'),
-            func.count(case([(News.sentiment == -1, 1)])).label('negative')
-        ).filter(
-            News.company_id == company.id,
-            News.date >= start_date,
-            News.date <= end_date
-        ).group_by(News.date).order_by(News.date).all()
+        # Tin mới thay đổi feature sentiment của các phiên trong khoảng
+        if total_added:
+            with stage("feature_materialize"):
+                materialize_features(db, [company.id], start_date, end_date)
+                db.commit()
+
+        # Lấy thống kê sentiment từ bảng tổng hợp
+        with stage("sentiment_stats"):
+            sentiment_stats = db.query(DailySentiment).filter(
+                DailySentiment.company_id == company.id,
+                DailySentiment.date >= start_date,
+                DailySentiment.date <= end_date
+            ).order_by(DailySentiment.date).all()
 
         if not sentiment_stats:
             return {
@@ -801,8 +815,9 @@ async def get_news_articles(symbol: str, days_ago: int, page: int = 1, items_per
 async def get_market_movers():
     try:
         url = f"https://www.alphavantage.co/query?function=TOP_GAINERS_LOSERS&apikey={ALPHA_VANTAGE_API_KEY_DEMO}"
-        response = requests.get(url)
-        data = response.json()
+        with stage("alphavantage_fetch", upstream="alphavantage"):
+            response = requests.get(url)
+            data = response.json()
         
         return {
             "top_gainers": data.get("top_gainers", [])[:20],  # Lấy top 5
@@ -823,7 +838,8 @@ async def get_market_news(page: int = 1, items_per_page: int = 12):
         finnhub_client = finnhub.Client(api_key=FINNHUB_API_KEY)
         
         # Lấy tất cả tin tức
-        news = finnhub_client.general_news('general', min_id=0)
+        with stage("finnhub_fetch", upstream="finnhub"):
+            news = finnhub_client.general_news('general', min_id=0)
         
         # Tính toán phân trang
         start_idx = (page - 1) * items_per_page
@@ -869,7 +885,8 @@ async def get_ipo_calendar(from_date: str = None, to_date: str = None):
         finnhub_client = finnhub.Client(api_key=FINNHUB_API_KEY)
         
         # Lấy dữ liệu IPO
-        ipo_data = finnhub_client.ipo_calendar(_from=from_date, to=to_date)
+        with stage("finnhub_fetch", upstream="finnhub"):
+            ipo_data = finnhub_client.ipo_calendar(_from=from_date, to=to_date)
         
         # Sắp xếp theo ngày
         if ipo_data & "ipoCalendar" in ipo_data:
@@ -897,7 +914,8 @@ async def get_market_indices():
         data = {}
         for name, symbol in indices.items():
             ticker = yf.Ticker(symbol)
-            hist = ticker.history(period="5d")  # Lấy dữ liệu trong 5 ngày
+            with stage("yf_history", upstream="yfinance"):
+                hist = ticker.history(period="5d")  # Lấy dữ liệu trong 5 ngày
             if hist.empty or len(hist) < 2:
                 logger.error(f"Not enough historical data found for {symbol}")
                 continue
@@ -922,8 +940,10 @@ async def get_market_indices():
 async def get_company_info(symbol: str, db: Session = Depends(get_db)):
     try:
         company = yf.Ticker(symbol)
-        info = company.info
-        financials = company.financials
+        with stage("yf_info", upstream="yfinance"):
+            info = company.info
+        with stage("yf_financials", upstream="yfinance"):
+            financials = company.financials
 
         # Xử lý các giá trị NaN trong financials
         financials = financials.replace({np.nan: None})
@@ -939,6 +959,77 @@ async def get_company_info(symbol: str, db: Session = Depends(get_db)):
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+def load_sector_panel(db, sector_id, start_date):
+    """Các cột (symbol, date, close, positive, negative) của mọi mã trong ngành từ start_date,
+    trong một truy vấn: giá đóng cửa kèm sentiment cùng ngày."""
+    return fetch_columns(db, select(
+        Company.symbol,
+        cast(Stocks.date, String),
+        cast(Stocks.close, Float),
+        func.coalesce(DailySentiment.positive, 0),
+        func.coalesce(DailySentiment.negative, 0)
+    ).join(Stocks, Stocks.company_id == Company.id).outerjoin(
+        DailySentiment,
+        and_(DailySentiment.company_id == Stocks.company_id, DailySentiment.date == Stocks.date)
+    ).where(
+        Company.sector_id == sector_id,
+        Stocks.date >= start_date.isoformat(),
+        Stocks.close.isnot(None)
+    ))
+
+# Phân tích theo ngành: lợi suất, biến động, tương quan và chỉ số theo sentiment của mọi mã trong ngành
+@app.get("/sector-analytics/{sector_name}")
+async def get_sector_analytics(
+    sector_name: str,
+    days: int = Query(180, ge=30, le=1825),
+    window: int = Query(20, ge=5, le=252),
+    include_correlation: bool = True,
+    db: Session = Depends(get_db),
+):
+    try:
+        sector = db.query(Sector).filter(Sector.name == sector_name).first()
+        if not sector:
+            raise HTTPException(status_code=404, detail=f"Không tìm thấy ngành {sector_name}")
+
+        start_date = datetime.now().date() - timedelta(days=days)
+        cache_key = (sector.id, start_date, window, include_correlation)
+        # Dấu thay đổi: dòng giá mới và mọi lần ghi đè giá/sentiment (updated_at có chỉ mục)
+        version = tuple(db.execute(select(
+            select(func.max(Stocks.id)).scalar_subquery(),
+            select(func.max(Stocks.updated_at)).scalar_subquery(),
+            select(func.max(DailySentiment.updated_at)).scalar_subquery()
+        )).one())
+        cached = sector_analytics_cache.get(cache_key)
+        if cached is not None and cached[0] == version:
+            return Response(cached[1], media_type="application/json")
+
+        with stage("panel_load"):
+            columns = load_sector_panel(db, sector.id, start_date)
+
+        if not columns[0]:
+            raise HTTPException(status_code=404, detail=f"Không có dữ liệu giá cho ngành {sector_name}")
+
+        # Tính toán trên panel 500 mã mất cỡ 100ms, chạy ngoài event loop
+        with stage("panel_compute"):
+            result = await run_in_threadpool(
+                sector_analytics, *columns, window=window, include_correlation=include_correlation
+            )
+        result["sector"] = sector.name
+        with stage("serialize"):
+            body = json.dumps(result).encode()
+        sector_analytics_cache.set(cache_key, (version, body))
+        return Response(body, media_type="application/json")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in get_sector_analytics for {sector_name}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Có lỗi xảy ra khi phân tích ngành {sector_name}: {str(e)}")
+
+# Metrics theo định dạng Prometheus
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
     
 # Chạy ứng dụng FastAPI
 if __name__ == "__main__":
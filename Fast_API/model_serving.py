@@ -0,0 +1,311 @@
+"""Phục vụ model GRU qua nhiều backend: Keras, SavedModel hoặc TFLite.
+
+- `export`: xuất gru_model.keras thành SavedModel hoặc TFLite (tùy chọn lượng
+  tử hóa float16 / int8 dynamic-range) với chữ ký (batch, SEQUENCE_LENGTH, N_FEATURES).
+- `load_backend`: nạp backend theo tên, mọi backend có `predict(batch) -> (batch, 1)`.
+- `warm_up`: chạy vài lượt suy luận với các kích thước batch để trả chi phí
+  khởi tạo/trace trước khi nhận request đầu tiên.
+- `check` / `bench`: so sánh đầu ra với Keras và đo độ trễ theo kích thước batch.
+
+Ví dụ (chạy trong thư mục Fast_API):
+    python model_serving.py export --format tflite --quantize float16
+    python model_serving.py check --backend tflite --artifact model_gru/gru_model_float16.tflite
+    python model_serving.py bench --backends keras savedmodel tflite --batch-sizes 1 8 64 512
+"""
+import argparse
+import logging
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+from forecasting import DEFAULT_MODEL_PATH
+
+logger = logging.getLogger(__name__)
+
+MODEL_DIR = os.path.dirname(DEFAULT_MODEL_PATH)
+BACKENDS = ("keras", "savedmodel", "tflite")
+
+
+def default_artifact(backend, quantize=None):
+    if backend == "savedmodel":
+        return os.path.join(MODEL_DIR, "gru_savedmodel")
+    if backend == "tflite":
+        suffix = f"_{quantize}" if quantize else ""
+        return os.path.join(MODEL_DIR, f"gru_model{suffix}.tflite")
+    return DEFAULT_MODEL_PATH
+
+
+class KerasBackend:
+    """Gọi model Keras qua một tf.function có chữ ký cố định (không trace lại theo batch)."""
+
+    name = "keras"
+
+    def __init__(self, path, sequence_length, n_features, num_threads=None):
+        import tensorflow as tf
+        from tensorflow.keras.models import load_model
+
+        _set_tf_threads(tf, num_threads)
+        model = load_model(path)
+
+        @tf.function(input_signature=[tf.TensorSpec([None, sequence_length, n_features], tf.float32)])
+        def serve(inputs):
+            return model(inputs, training=False)
+
+        self._fn = serve
+
+    def predict(self, batch):
+        return self._fn(np.asarray(batch, dtype=np.float32)).numpy()
+
+
+class SavedModelBackend:
+    name = "savedmodel"
+
+    def __init__(self, path, sequence_length, n_features, num_threads=None):
+        import tensorflow as tf
+
+        _set_tf_threads(tf, num_threads)
+        self._loaded = tf.saved_model.load(path)
+        self._fn = self._loaded.signatures["serving_default"]
+        self._output = next(iter(self._fn.structured_outputs))
+
+    def predict(self, batch):
+        return self._fn(inputs=np.asarray(batch, dtype=np.float32))[self._output].numpy()
+
+
+class TFLiteBackend:
+    """Interpreter TFLite (XNNPACK trên CPU). Dùng tflite_runtime/ai_edge_litert nếu đã cài,
+    khi đó worker không cần nạp toàn bộ TensorFlow."""
+
+    name = "tflite"
+
+    def __init__(self, path, sequence_length, n_features, num_threads=None):
+        try:
+            from ai_edge_litert.interpreter import Interpreter
+        except ImportError:
+            try:
+                from tflite_runtime.interpreter import Interpreter
+            except ImportError:
+                import tensorflow as tf
+
+                Interpreter = tf.lite.Interpreter
+        self._interpreter = Interpreter(model_path=path, num_threads=num_threads)
+        self._input = self._interpreter.get_input_details()[0]["index"]
+        self._output = self._interpreter.get_output_details()[0]["index"]
+        self._batch_size = None
+        # Interpreter không an toàn khi gọi song song từ nhiều thread
+        self._lock = threading.Lock()
+
+    def predict(self, batch):
+        batch = np.asarray(batch, dtype=np.float32)
+        with self._lock:
+            if batch.shape[0] != self._batch_size:
+                self._interpreter.resize_tensor_input(self._input, batch.shape)
+                self._interpreter.allocate_tensors()
+                self._batch_size = batch.shape[0]
+            self._interpreter.set_tensor(self._input, batch)
+            self._interpreter.invoke()
+            return self._interpreter.get_tensor(self._output).copy()
+
+
+def _set_tf_threads(tf, num_threads):
+    if num_threads:
+        try:
+            tf.config.threading.set_intra_op_parallelism_threads(num_threads)
+            tf.config.threading.set_inter_op_parallelism_threads(1)
+        except RuntimeError:
+            # TensorFlow đã khởi tạo runtime, giữ cấu hình hiện tại
+            pass
+
+
+def load_backend(name, path=None, sequence_length=30, n_features=8, num_threads=None):
+    backends = {"keras": KerasBackend, "savedmodel": SavedModelBackend, "tflite": TFLiteBackend}
+    if name not in backends:
+        raise ValueError(f"Unknown model backend '{name}', expected one of {BACKENDS}")
+    started = time.perf_counter()
+    backend = backends[name](path or default_artifact(name), sequence_length, n_features, num_threads)
+    logger.info(f"Loaded {name} model backend in {time.perf_counter() - started:.2f}s")
+    return backend
+
+
+def warm_up(backend, sequence_length, n_features, batch_sizes=(1,)):
+    """Chạy suy luận trên input rỗng để trace/cấp phát trước cho từng kích thước batch."""
+    started = time.perf_counter()
+    for batch_size in batch_sizes:
+        backend.predict(np.zeros((batch_size, sequence_length, n_features), dtype=np.float32))
+    logger.info(f"Warmed up {backend.name} backend for batch sizes {list(batch_sizes)} in {time.perf_counter() - started:.2f}s")
+
+
+def export(keras_path, fmt, output=None, quantize=None, sequence_length=30, n_features=8):
+    """Xuất model Keras thành SavedModel hoặc TFLite với chữ ký (None, sequence_length, n_features)."""
+    import tensorflow as tf
+    from tensorflow.keras.models import load_model
+
+    model = load_model(keras_path)
+    if fmt == "tflite":
+        # Vòng lặp while của GRU cần Select TF ops; với độ dài chuỗi cố định thì
+        # unroll để TFLite chỉ dùng builtin ops (chạy được trên tflite_runtime)
+        model = _unrolled(model)
+
+    @tf.function(input_signature=[tf.TensorSpec([None, sequence_length, n_features], tf.float32, name="inputs")])
+    def serve(inputs):
+        return {"prediction": model(inputs, training=False)}
+
+    module = tf.Module()
+    module.model = model
+    module.serve = serve
+    output = output or default_artifact(fmt, quantize)
+
+    if fmt == "savedmodel":
+        if quantize:
+            raise ValueError("Quantization is only supported for the tflite format")
+        tf.saved_model.save(module, output, signatures={"serving_default": module.serve.get_concrete_function()})
+    elif fmt == "tflite":
+        # Không truyền module để trọng số được đóng băng thành hằng số
+        converter = tf.lite.TFLiteConverter.from_concrete_functions([serve.get_concrete_function()])
+        if quantize in ("float16", "int8"):
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+            if quantize == "float16":
+                converter.target_spec.supported_types = [tf.float16]
+        elif quantize:
+            raise ValueError(f"Unknown quantization '{quantize}', expected float16 or int8")
+        flatbuffer = converter.convert()
+        with open(output, "wb") as f:
+            f.write(flatbuffer)
+    else:
+        raise ValueError(f"Unknown export format '{fmt}', expected savedmodel or tflite")
+    logger.info(f"Exported {keras_path} to {output}")
+    return output
+
+
+def _unrolled(model):
+    """Bản sao của model với các lớp RNN đặt unroll=True, dùng chung trọng số."""
+    config = model.get_config()
+    for layer in config["layers"]:
+        if layer["class_name"] in ("GRU", "LSTM", "SimpleRNN"):
+            layer["config"]["unroll"] = True
+    clone = model.__class__.from_config(config)
+    clone.set_weights(model.get_weights())
+    return clone
+
+
+def sample_inputs(batch_size, sequence_length, n_features, seed=0):
+    """Input ngẫu nhiên để đo độ trễ (volume thô, sentiment đếm); không dùng để so sai số vì làm model bão hòa."""
+    rng = np.random.default_rng(seed)
+    batch = rng.uniform(0, 1, (batch_size, sequence_length, n_features))
+    batch[..., 4] = rng.uniform(1e6, 5e7, (batch_size, sequence_length))
+    batch[..., 5] = 0
+    batch[..., 6:8] = rng.integers(0, 90, (batch_size, sequence_length, 2))
+    return batch.astype(np.float32)
+
+
+def parity_inputs(batch_size, sequence_length, n_features, seed=0):
+    """Input theo layout đã chuẩn hóa của feature store (features.INPUT_COLUMNS, mọi cột trong [0, 1]).
+
+    Giá là bước ngẫu nhiên quanh một mức chung của cửa sổ, như chuỗi thật; volume và sentiment
+    ngẫu nhiên trong [0, 1], cột mã bằng SYMBOL_INDEX như lúc phục vụ.
+    """
+    from features import INPUT_COLUMNS, SYMBOL_INDEX
+
+    rng = np.random.default_rng(seed)
+    level = rng.uniform(0.05, 0.95, (batch_size, 1)) + np.cumsum(rng.normal(0, 0.01, (batch_size, sequence_length)), axis=1)
+    level = np.clip(level, 0, 1)
+    prices = {"open": level, "high": level * 1.01, "low": level * 0.99, "adj_close": level}
+    batch = rng.uniform(0, 1, (batch_size, sequence_length, n_features))
+    for i, column in enumerate(INPUT_COLUMNS[:n_features]):
+        if column in prices:
+            batch[..., i] = np.clip(prices[column], 0, 1)
+        elif column == "symbol":
+            batch[..., i] = SYMBOL_INDEX
+    return batch.astype(np.float32)
+
+
+# Độ lệch chuẩn tối thiểu của đầu ra Keras trên batch kiểm tra; thấp hơn nghĩa là model bão hòa
+# (cùng một giá trị cho mọi input) và so sánh sai số không còn ý nghĩa
+MIN_REFERENCE_STD = 1e-3
+
+
+def check_parity(backend, reference, sequence_length, n_features, batch_size=256):
+    """Sai số tuyệt đối lớn nhất giữa backend và model Keras gốc trên input đã chuẩn hóa.
+
+    ValueError nếu đầu ra của Keras gần như hằng số trên batch kiểm tra.
+    """
+    batch = parity_inputs(batch_size, sequence_length, n_features)
+    expected = reference.predict(batch)
+    spread = float(np.std(expected))
+    if spread < MIN_REFERENCE_STD:
+        raise ValueError(f"Keras output is constant on the parity batch (std {spread:.2e}), the model is saturated")
+    return float(np.max(np.abs(backend.predict(batch) - expected)))
+
+
+def benchmark(backend, sequence_length, n_features, batch_sizes, repeats=20):
+    """Độ trễ trung vị (ms) mỗi lần gọi predict theo kích thước batch."""
+    results = {}
+    for batch_size in batch_sizes:
+        batch = sample_inputs(batch_size, sequence_length, n_features)
+        backend.predict(batch)
+        timings = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            backend.predict(batch)
+            timings.append(time.perf_counter() - started)
+        results[batch_size] = float(np.median(timings) * 1000)
+    return results
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Xuất, kiểm tra và đo hiệu năng model GRU")
+    parser.add_argument("--model", default=os.getenv("MODEL_PATH", DEFAULT_MODEL_PATH), help="Model Keras gốc")
+    parser.add_argument("--sequence-length", type=int, default=int(os.getenv("SEQUENCE_LENGTH", "30")))
+    parser.add_argument("--n-features", type=int, default=int(os.getenv("N_FEATURES", "8")))
+    parser.add_argument("--num-threads", type=int, default=None)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    exp = sub.add_parser("export", help="Xuất SavedModel/TFLite")
+    exp.add_argument("--format", choices=("savedmodel", "tflite"), required=True)
+    exp.add_argument("--quantize", choices=("float16", "int8"))
+    exp.add_argument("--output")
+
+    chk = sub.add_parser("check", help="So sánh đầu ra của một backend với Keras")
+    chk.add_argument("--backend", choices=BACKENDS, required=True)
+    chk.add_argument("--artifact")
+    chk.add_argument("--tolerance", type=float, default=1e-3)
+
+    bench = sub.add_parser("bench", help="Đo độ trễ theo kích thước batch")
+    bench.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    bench.add_argument("--artifacts", nargs="*", default=[], help="Đường dẫn artifact theo thứ tự --backends")
+    bench.add_argument("--batch-sizes", nargs="+", type=int, default=[1, 8, 64, 512])
+    bench.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    shape = (args.sequence_length, args.n_features)
+    if args.command == "export":
+        export(args.model, args.format, args.output, args.quantize, *shape)
+        return
+
+    reference = load_backend("keras", args.model, *shape, args.num_threads)
+    if args.command == "check":
+        backend = load_backend(args.backend, args.artifact, *shape, args.num_threads)
+        try:
+            error = check_parity(backend, reference, *shape)
+        except ValueError as e:
+            print(f"{args.backend}: {e}", file=sys.stderr)
+            sys.exit(1)
+        print(f"{args.backend}: max abs error vs keras = {error:.2e} (tolerance {args.tolerance:.0e})")
+        sys.exit(0 if error <= args.tolerance else 1)
+
+    print(f"{'backend':<32}{'max err':>10}" + "".join(f"{f'b={b} ms':>12}" for b in args.batch_sizes))
+    for i, name in enumerate(args.backends):
+        artifact = args.artifacts[i] if i < len(args.artifacts) else (args.model if name == "keras" else None)
+        backend = reference if name == "keras" and artifact == args.model else load_backend(name, artifact, *shape, args.num_threads)
+        error = check_parity(backend, reference, *shape)
+        latencies = benchmark(backend, *shape, args.batch_sizes, args.repeats)
+        label = f"{name}:{os.path.basename(artifact)}" if artifact else name
+        print(f"{label:<32}{error:>10.1e}" + "".join(f"{latencies[b]:>12.3f}" for b in args.batch_sizes))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+# Phân tích theo ngành trên panel ngày × mã (NumPy): lợi suất, biến động
+# trượt, ma trận tương quan và chỉ số có trọng số theo sentiment.
+# Giá trị thiếu (mã chưa niêm yết, ngày không có dữ liệu) là NaN và được bỏ
+# qua theo từng cặp/cửa sổ thay vì loại cả hàng.
+import warnings
+
+import numpy as np
+
+TRADING_DAYS_PER_YEAR = 252
+
+
+def build_panel(symbols, dates, close, positive, negative):
+    """Dựng panel từ các cột song song (mỗi phần tử là một dòng stocks).
+
+    `dates` là date hoặc chuỗi ISO. Trả về (dates, symbols, close, positive,
+    negative): dates (datetime64[D]) và symbols đã sắp xếp, close là mảng
+    (T, N) với NaN ở ô thiếu, sentiment là 0 khi không có tin.
+    """
+    panel_dates, date_index = np.unique(np.asarray(dates, dtype="datetime64[D]"), return_inverse=True)
+    panel_symbols, symbol_index = np.unique(np.asarray(symbols), return_inverse=True)
+    shape = (len(panel_dates), len(panel_symbols))
+
+    close_panel = np.full(shape, np.nan)
+    close_panel[date_index, symbol_index] = np.asarray(close, dtype=float)
+    positive_panel = np.zeros(shape)
+    positive_panel[date_index, symbol_index] = np.asarray(positive, dtype=float)
+    negative_panel = np.zeros(shape)
+    negative_panel[date_index, symbol_index] = np.asarray(negative, dtype=float)
+    return panel_dates, panel_symbols, close_panel, positive_panel, negative_panel
+
+
+def simple_returns(close):
+    """Lợi suất ngày (T-1, N); NaN nếu thiếu giá ở một trong hai ngày."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return close[1:] / close[:-1] - 1.0
+
+
+def rolling_volatility(returns, window=20, min_periods=None, annualize=True):
+    """Độ lệch chuẩn trượt theo cột, bỏ qua NaN; tính bằng tổng tích lũy nên O(T·N)."""
+    min_periods = min_periods or window
+    valid = ~np.isnan(returns)
+    values = np.where(valid, returns, 0.0)
+
+    def window_sum(a):
+        cumulative = np.cumsum(np.vstack([np.zeros((1, a.shape[1])), a]), axis=0)
+        start = np.maximum(np.arange(1, len(a) + 1) - window, 0)
+        return cumulative[1:] - cumulative[start]
+
+    n = window_sum(valid.astype(float))
+    total = window_sum(values)
+    total_sq = window_sum(values ** 2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        variance = (total_sq - total ** 2 / n) / (n - 1)
+    volatility = np.sqrt(np.clip(variance, 0.0, None))
+    volatility[n < max(min_periods, 2)] = np.nan
+    return volatility * np.sqrt(TRADING_DAYS_PER_YEAR) if annualize else volatility
+
+
+def correlation_matrix(returns, min_periods=20):
+    """Tương quan Pearson từng cặp trên các ngày cả hai mã đều có dữ liệu.
+
+    Dùng các phép nhân ma trận có mặt nạ thay vì lặp theo cặp:
+    n = MᵀM, Σx = XᵀM, Σx² = (X²)ᵀM, Σxy = XᵀX với M là mặt nạ hợp lệ và X đã thay NaN bằng 0.
+    """
+    valid = ~np.isnan(returns)
+    mask = valid.astype(float)
+    x = np.where(valid, returns, 0.0)
+
+    n = mask.T @ mask
+    sum_x = x.T @ mask          # [i, j]: tổng x_i trên các ngày i và j cùng hợp lệ
+    sum_xx = (x ** 2).T @ mask
+    sum_xy = x.T @ x
+    covariance = n * sum_xy - sum_x * sum_x.T
+    variance = n * sum_xx - sum_x ** 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        corr = covariance / np.sqrt(variance * variance.T)
+    corr = np.clip(corr, -1.0, 1.0)
+    corr[n < max(min_periods, 2)] = np.nan
+    diagonal = np.diag(n) >= max(min_periods, 2)
+    corr[np.diag_indices_from(corr)] = np.where(diagonal, 1.0, np.nan)
+    return corr
+
+
+def net_sentiment(positive, negative):
+    """(tích cực - tiêu cực) / tổng số tin, 0 khi không có tin."""
+    total = positive + negative
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(total > 0, (positive - negative) / total, 0.0)
+
+
+def weighted_index(returns, weights=None, base=100.0):
+    """Chỉ số ngành từ lợi suất (T-1, N): trung bình có trọng số trên các mã có dữ liệu mỗi ngày.
+
+    Trả về mức chỉ số (T,) bắt đầu từ `base`.
+    """
+    valid = ~np.isnan(returns)
+    weights = np.ones_like(returns) if weights is None else weights
+    weights = np.where(valid, weights, 0.0)
+    total_weight = weights.sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        daily = np.where(total_weight > 0, (np.where(valid, returns, 0.0) * weights).sum(axis=1) / total_weight, 0.0)
+    return base * np.concatenate([[1.0], np.cumprod(1.0 + daily)])
+
+
+def sentiment_weights(positive, negative):
+    """Trọng số 1 + net sentiment của ngày t (0..2, mã không có tin giữ trọng số 1)."""
+    return 1.0 + net_sentiment(positive, negative)[1:]
+
+
+def nan_to_none(array, decimals=6):
+    """Chuyển mảng sang list cho JSON, NaN/inf thành None."""
+    array = np.round(np.asarray(array, dtype=float), decimals)
+    result = array.astype(object)
+    result[~np.isfinite(array)] = None
+    return result.tolist()
+
+
+def sector_analytics(symbols, dates, close, positive, negative, window=20, include_correlation=True):
+    """Toàn bộ chỉ số của một ngành từ các dòng (symbol, date, close, positive, negative), sẵn sàng trả JSON.
+
+    Mọi chuỗi theo ngày có cùng độ dài với `dates` (ngày đầu không có lợi suất là None).
+    """
+    dates, symbols, close, positive, negative = build_panel(symbols, dates, close, positive, negative)
+    returns = simple_returns(close)
+    volatility = rolling_volatility(returns, window, min_periods=max(2, window // 2))
+    padding = np.full((1, len(symbols)), np.nan)
+
+    valid = ~np.isnan(close)
+    first = np.argmax(valid, axis=0)
+    last = len(dates) - 1 - np.argmax(valid[::-1], axis=0)
+    columns = np.arange(len(symbols))
+    cumulative_return = close[last, columns] / close[first, columns] - 1.0
+
+    with warnings.catch_warnings():
+        # Ngày không mã nào đủ dữ liệu cho cửa sổ trượt
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        median_volatility = np.nanmedian(np.vstack([padding, volatility]), axis=1)
+
+    result = {
+        "symbols": symbols.tolist(),
+        "dates": np.datetime_as_string(dates).tolist(),
+        "index": {
+            "equal_weighted": nan_to_none(weighted_index(returns)),
+            "sentiment_weighted": nan_to_none(weighted_index(returns, sentiment_weights(positive, negative))),
+        },
+        "volatility": {
+            "window": window,
+            "latest": nan_to_none(volatility[-1]),
+            "median": nan_to_none(median_volatility),
+        },
+        "cumulative_return": nan_to_none(cumulative_return),
+        "net_sentiment": nan_to_none(net_sentiment(positive.sum(axis=0), negative.sum(axis=0))),
+        "correlation": None,
+        "average_correlation": None,
+    }
+    if include_correlation:
+        corr = correlation_matrix(returns, min_periods=window)
+        off_diagonal = corr[~np.eye(len(symbols), dtype=bool)]
+        result["correlation"] = nan_to_none(corr, decimals=4)
+        if np.isfinite(off_diagonal).any():
+            result["average_correlation"] = round(float(np.nanmean(off_diagonal)), 6)
+    return result
@@ -0,0 +1,73 @@
+-- **- Chia bảng stocks và news theo tháng (PostgreSQL 11+)**
+-- Bảng cũ được đổi tên thành *_legacy và dữ liệu được chép sang bảng phân vùng.
+-- Sau khi kiểm tra số dòng có thể xóa: DROP TABLE news_legacy; DROP TABLE stocks_legacy;
+
+-- Cột sentiment được ORM thêm sau create_database.sql
+ALTER TABLE news ADD COLUMN IF NOT EXISTS sentiment INTEGER;
+
+-- Tạo các phân vùng tháng [from_date, to_date] cho bảng cha. Dòng thuộc tháng
+-- mới đã lỡ rơi vào phân vùng default được chuyển sang phân vùng vừa tạo.
+CREATE OR REPLACE FUNCTION create_monthly_partitions(parent TEXT, from_date DATE, to_date DATE)
+RETURNS VOID AS $$
+DECLARE
+    month_start DATE := date_trunc('month', from_date)::DATE;
+    next_month DATE;
+    partition_name TEXT;
+BEGIN
+    WHILE month_start <= to_date LOOP
+        next_month := (month_start + INTERVAL '1 month')::DATE;
+        partition_name := format('%s_y%sm%s', parent, to_char(month_start, 'YYYY'), to_char(month_start, 'MM'));
+        IF to_regclass(partition_name) IS NULL THEN
+            EXECUTE format('CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS)', partition_name, parent);
+            IF to_regclass(parent || '_default') IS NOT NULL THEN
+                EXECUTE format(
+                    'WITH moved AS (DELETE FROM %I WHERE date >= %L AND date < %L RETURNING *) INSERT INTO %I SELECT * FROM moved',
+                    parent || '_default', month_start, next_month, partition_name
+                );
+            END IF;
+            EXECUTE format('ALTER TABLE %I ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)', parent, partition_name, month_start, next_month);
+        END IF;
+        month_start := next_month;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- **- Stocks**
+ALTER TABLE stocks RENAME TO stocks_legacy;
+ALTER INDEX IF EXISTS stocks_pkey RENAME TO stocks_legacy_pkey;
+
+CREATE TABLE stocks (LIKE stocks_legacy INCLUDING DEFAULTS) PARTITION BY RANGE (date);
+ALTER TABLE stocks ADD PRIMARY KEY (id, date);
+ALTER TABLE stocks ADD CONSTRAINT uq_stocks_date_company UNIQUE (date, company_id);
+ALTER TABLE stocks ADD FOREIGN KEY (company_id) REFERENCES companies(id);
+CREATE INDEX idx_stocks_company_date ON stocks (company_id, date);
+ALTER SEQUENCE stocks_id_seq OWNED BY stocks.id;
+
+CREATE TABLE stocks_default PARTITION OF stocks DEFAULT;
+SELECT create_monthly_partitions(
+    'stocks',
+    COALESCE((SELECT MIN(date) FROM stocks_legacy), CURRENT_DATE),
+    (CURRENT_DATE + INTERVAL '3 months')::DATE
+);
+INSERT INTO stocks SELECT * FROM stocks_legacy;
+ANALYZE stocks;
+
+-- **- News**
+ALTER TABLE news RENAME TO news_legacy;
+ALTER INDEX IF EXISTS news_pkey RENAME TO news_legacy_pkey;
+
+CREATE TABLE news (LIKE news_legacy INCLUDING DEFAULTS) PARTITION BY RANGE (date);
+ALTER TABLE news ADD PRIMARY KEY (id, date);
+ALTER TABLE news ADD CONSTRAINT uq_news_date_company_url UNIQUE (date, company_id, url);
+ALTER TABLE news ADD FOREIGN KEY (company_id) REFERENCES companies(id);
+CREATE INDEX idx_news_company_date ON news (company_id, date);
+ALTER SEQUENCE news_id_seq OWNED BY news.id;
+
+CREATE TABLE news_default PARTITION OF news DEFAULT;
+SELECT create_monthly_partitions(
+    'news',
+    COALESCE((SELECT MIN(date) FROM news_legacy), CURRENT_DATE),
+    (CURRENT_DATE + INTERVAL '3 months')::DATE
+);
+INSERT INTO news SELECT * FROM news_legacy;
+ANALYZE news;
@@ -0,0 +1,17 @@
+-- **- Bảng tổng hợp sentiment theo ngày, được cập nhật khi thêm tin tức**
+CREATE TABLE daily_sentiment (
+company_id INT NOT NULL REFERENCES companies(id) ON DELETE CASCADE,
+date DATE NOT NULL,
+positive INT NOT NULL DEFAULT 0,
+negative INT NOT NULL DEFAULT 0,
+PRIMARY KEY (company_id, date)
+);
+
+-- Tính lại từ dữ liệu tin tức hiện có
+INSERT INTO daily_sentiment (company_id, date, positive, negative)
+SELECT company_id, date,
+       COUNT(*) FILTER (WHERE sentiment = 1),
+       COUNT(*) FILTER (WHERE sentiment = -1)
+FROM news
+WHERE company_id IS NOT NULL
+GROUP BY company_id, date;
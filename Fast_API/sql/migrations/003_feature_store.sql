@@ -0,0 +1,24 @@
+-- **- Feature store: tham số chuẩn hóa theo phiên bản và feature đã chuẩn hóa của từng (phiên bản, công ty, ngày)**
+CREATE TABLE feature_params (
+version SERIAL PRIMARY KEY,
+created_at TIMESTAMP NOT NULL DEFAULT now(),
+minimums TEXT NOT NULL,
+maximums TEXT NOT NULL,
+ready BOOLEAN NOT NULL DEFAULT FALSE
+);
+
+-- Khóa chính (version, company_id, date) là chỉ mục cho truy vấn cửa sổ SEQUENCE_LENGTH phiên gần nhất
+CREATE TABLE stock_features (
+version INT NOT NULL REFERENCES feature_params(version) ON DELETE CASCADE,
+company_id INT NOT NULL REFERENCES companies(id) ON DELETE CASCADE,
+date DATE NOT NULL,
+open DOUBLE PRECISION NOT NULL,
+high DOUBLE PRECISION NOT NULL,
+low DOUBLE PRECISION NOT NULL,
+close DOUBLE PRECISION NOT NULL,
+adj_close DOUBLE PRECISION NOT NULL,
+volume DOUBLE PRECISION NOT NULL,
+positive DOUBLE PRECISION NOT NULL,
+negative DOUBLE PRECISION NOT NULL,
+PRIMARY KEY (version, company_id, date)
+);
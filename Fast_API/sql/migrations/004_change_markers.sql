@@ -0,0 +1,9 @@
+-- **- Thời điểm ghi gần nhất của từng dòng stocks và daily_sentiment**
+-- MAX(updated_at) là dấu thay đổi của cache /sector-analytics: nhận ra cả dòng bị ghi đè
+-- (upsert giá của backfill.py, cộng dồn/tính lại sentiment), không chỉ dòng mới.
+-- Giờ UTC, cùng múi giờ với giá trị ứng dụng ghi vào.
+ALTER TABLE stocks ADD COLUMN updated_at TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'utc');
+CREATE INDEX idx_stocks_updated_at ON stocks (updated_at);
+
+ALTER TABLE daily_sentiment ADD COLUMN updated_at TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'utc');
+CREATE INDEX idx_daily_sentiment_updated_at ON daily_sentiment (updated_at);
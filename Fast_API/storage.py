@@ -0,0 +1,273 @@
+"""Lưu trữ tin tức/giá: bảng tổng hợp daily_sentiment, migration SQL,
+phân vùng theo tháng và chính sách lưu giữ nội dung bài báo.
+
+- `add_daily_sentiment` / `daily_sentiment_counts`: ghi và đọc bảng tổng hợp,
+  dùng trong các endpoint thu thập tin tức; `refresh_daily_sentiment` tính lại
+  từ bảng news sau khi ghi hàng loạt (backfill.py), `rollup_stock_sentiment`
+  chép số tin vào các cột sentiment của stocks.
+- `fetch_columns`: đọc kết quả lớn theo cột, không qua Row của SQLAlchemy.
+- `migrate`: chạy các file trong sql/migrations theo thứ tự (ghi lại trong
+  bảng schema_migrations).
+- `partitions`: tạo trước phân vùng tháng cho news/stocks (chạy định kỳ, vd. cron hằng tháng).
+- `retention`: chuyển `content` của bài báo cũ hơn N ngày ra file .jsonl.gz
+  theo tháng rồi xóa khỏi database; tiêu đề, URL và sentiment được giữ lại.
+
+Ví dụ (chạy trong thư mục Fast_API):
+    python storage.py migrate
+    python storage.py partitions --months-ahead 3
+    python storage.py retention --content-days 180 --archive-dir archive/news
+"""
+import argparse
+import gzip
+import json
+import logging
+import os
+from datetime import date, datetime, timedelta
+
+from database import DailySentiment, News, Stocks, upsert_insert
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sql", "migrations")
+PARTITIONED_TABLES = ("news", "stocks")
+
+
+def add_daily_sentiment(db, company_id, day, positive=0, negative=0):
+    """Cộng dồn số tin vào daily_sentiment trong transaction hiện tại của session,
+    nên được commit (hoặc rollback) cùng với bài báo vừa thêm."""
+    insert = upsert_insert(db.get_bind())
+    stmt = insert(DailySentiment).values(company_id=company_id, date=day, positive=positive, negative=negative)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[DailySentiment.company_id, DailySentiment.date],
+        set_={
+            "positive": DailySentiment.positive + stmt.excluded.positive,
+            "negative": DailySentiment.negative + stmt.excluded.negative,
+            "updated_at": stmt.excluded.updated_at,
+        },
+    )
+    db.execute(stmt)
+
+
+def daily_sentiment_counts(db, company_id, start, end):
+    """{date: (positive, negative)} của một công ty trong [start, end]."""
+    rows = db.query(DailySentiment).filter(
+        DailySentiment.company_id == company_id,
+        DailySentiment.date >= start,
+        DailySentiment.date <= end
+    ).order_by(DailySentiment.date).all()
+    return {row.date: (row.positive, row.negative) for row in rows}
+
+
+def refresh_daily_sentiment(db, company_id, start, end):
+    """Tính lại daily_sentiment của một công ty trong [start, end] từ bảng news.
+
+    Dùng sau khi ghi tin hàng loạt với ON CONFLICT DO NOTHING, khi không biết
+    chính xác dòng nào được thêm; kết quả đúng bất kể tin đã có từ trước.
+    """
+    from sqlalchemy import case, func, literal, select
+
+    insert = upsert_insert(db.get_bind())
+    counts = select(
+        News.company_id,
+        News.date,
+        func.sum(case((News.sentiment == 1, 1), else_=0)),
+        func.sum(case((News.sentiment == -1, 1), else_=0)),
+        literal(datetime.utcnow(), DailySentiment.updated_at.type),
+    ).where(
+        News.company_id == company_id,
+        News.date >= start,
+        News.date <= end
+    ).group_by(News.company_id, News.date)
+    stmt = insert(DailySentiment).from_select(
+        [DailySentiment.company_id, DailySentiment.date, DailySentiment.positive, DailySentiment.negative,
+         DailySentiment.updated_at], counts
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[DailySentiment.company_id, DailySentiment.date],
+        set_={
+            "positive": stmt.excluded.positive,
+            "negative": stmt.excluded.negative,
+            "updated_at": stmt.excluded.updated_at,
+        },
+    )
+    db.execute(stmt)
+
+
+def rollup_stock_sentiment(db, company_ids, start, end):
+    """Chép số tin từ daily_sentiment vào news_positive/negative_sentiment của các dòng
+    stocks trong [start, end] (0 nếu ngày không có tin), như bước rollup của
+    /predict-using-gru; các ngày ngoài khoảng không đổi."""
+    from sqlalchemy import func, select, update
+
+    def count(column):
+        return func.coalesce(select(column).where(
+            DailySentiment.company_id == Stocks.company_id,
+            DailySentiment.date == Stocks.date
+        ).scalar_subquery(), 0)
+
+    db.execute(update(Stocks).where(
+        Stocks.company_id.in_(company_ids),
+        Stocks.date >= start,
+        Stocks.date <= end
+    ).values(
+        news_positive_sentiment=count(DailySentiment.positive),
+        news_negative_sentiment=count(DailySentiment.negative)
+    ).execution_options(synchronize_session=False))
+
+
+def fetch_columns(db, statement):
+    """Chạy câu SELECT trên kết nối DBAPI của session và trả về từng cột dạng tuple.
+
+    Bỏ qua bước dựng Row của SQLAlchemy (chiếm phần lớn thời gian khi đọc hàng
+    trăm nghìn dòng). Không có xử lý kiểu của SQLAlchemy: tham số phải là kiểu
+    driver hiểu trực tiếp và giá trị trả về là kiểu của driver (vd. CAST sang
+    FLOAT/VARCHAR để PostgreSQL và SQLite trả về cùng kiểu).
+    """
+    connection = db.connection()
+    # render_postcompile: mở rộng tham số IN (...) thành từng tham số cho DBAPI
+    compiled = statement.compile(dialect=connection.dialect, compile_kwargs={"render_postcompile": True})
+    params = compiled.construct_params()
+    if compiled.positional:
+        params = [params[name] for name in compiled.positiontup]
+    cursor = connection.connection.cursor()
+    try:
+        cursor.execute(str(compiled), params)
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+    width = len(statement.selected_columns)
+    return list(zip(*rows)) if rows else [()] * width
+
+
+def migrate(engine, migrations_dir=MIGRATIONS_DIR):
+    """Chạy các migration chưa áp dụng, mỗi file trong một transaction."""
+    applied = []
+    # Dùng kết nối DBAPI trực tiếp để file SQL (có nhiều câu lệnh, ký tự %) được gửi nguyên vẹn
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "version TEXT PRIMARY KEY, applied_at TIMESTAMP NOT NULL DEFAULT now())"
+        )
+        connection.commit()
+        cursor.execute("SELECT version FROM schema_migrations")
+        done = {row[0] for row in cursor.fetchall()}
+        for name in sorted(f for f in os.listdir(migrations_dir) if f.endswith(".sql")):
+            if name in done:
+                continue
+            with open(os.path.join(migrations_dir, name)) as f:
+                sql = f.read()
+            logger.info(f"Applying migration {name}")
+            try:
+                cursor.execute(sql)
+                cursor.execute("INSERT INTO schema_migrations (version) VALUES (%s)", (name,))
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+            applied.append(name)
+    finally:
+        connection.close()
+    return applied
+
+
+def create_partitions(engine, months_ahead=3):
+    """Tạo phân vùng từ tháng hiện tại tới `months_ahead` tháng sau cho news và stocks."""
+    from sqlalchemy import text
+
+    with engine.begin() as conn:
+        for table in PARTITIONED_TABLES:
+            conn.execute(
+                text("SELECT create_monthly_partitions(:table, CURRENT_DATE, (CURRENT_DATE + make_interval(months => :months))::DATE)"),
+                {"table": table, "months": months_ahead},
+            )
+    logger.info(f"Ensured monthly partitions up to {months_ahead} months ahead for {', '.join(PARTITIONED_TABLES)}")
+
+
+def _month_starts(first, last):
+    month = first.replace(day=1)
+    while month <= last:
+        yield month
+        month = (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def archive_news_content(engine, content_days, archive_dir=None, batch_size=5000):
+    """Xóa `content` của tin cũ hơn `content_days` ngày, ghi ra archive_dir trước nếu có.
+
+    Làm theo từng tháng (một phân vùng) và từng batch id để transaction ngắn;
+    chạy lại an toàn vì chỉ xét các dòng còn content.
+    """
+    from sqlalchemy import text
+
+    cutoff = date.today() - timedelta(days=content_days)
+    with engine.connect() as conn:
+        first = conn.execute(
+            text("SELECT MIN(date) FROM news WHERE content IS NOT NULL AND date < :cutoff"), {"cutoff": cutoff}
+        ).scalar()
+    if first is None:
+        logger.info(f"No article content older than {cutoff} to archive")
+        return 0
+
+    if archive_dir:
+        os.makedirs(archive_dir, exist_ok=True)
+    total = 0
+    for month in _month_starts(first, cutoff):
+        next_month = (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+        end = min(next_month, cutoff)
+        path = os.path.join(archive_dir, f"news_content_{month:%Y_%m}.jsonl.gz") if archive_dir else None
+        while True:
+            with engine.begin() as conn:
+                rows = conn.execute(text(
+                    "SELECT id, date, company_id, url, content FROM news "
+                    "WHERE date >= :start AND date < :end AND content IS NOT NULL "
+                    "ORDER BY id LIMIT :limit"
+                ), {"start": month, "end": end, "limit": batch_size}).fetchall()
+                if not rows:
+                    break
+                if path:
+                    # Mỗi lần ghi thêm một member gzip; gzip đọc nối tiếp được
+                    with gzip.open(path, "at", encoding="utf-8") as f:
+                        for row in rows:
+                            f.write(json.dumps({
+                                "id": row.id, "date": row.date.isoformat(), "company_id": row.company_id,
+                                "url": row.url, "content": row.content,
+                            }) + "\n")
+                conn.execute(text(
+                    "UPDATE news SET content = NULL WHERE date >= :start AND date < :end AND id = ANY(:ids)"
+                ), {"start": month, "end": end, "ids": [row.id for row in rows]})
+            total += len(rows)
+        logger.info(f"Archived content up to {end} ({total} articles so far)")
+    return total
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Migration, phân vùng và lưu giữ dữ liệu tin tức/giá")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("migrate", help="Chạy các migration trong sql/migrations")
+    part = sub.add_parser("partitions", help="Tạo trước phân vùng tháng cho news và stocks")
+    part.add_argument("--months-ahead", type=int, default=3)
+    ret = sub.add_parser("retention", help="Lưu trữ và xóa nội dung bài báo cũ")
+    ret.add_argument("--content-days", type=int, default=int(os.getenv("NEWS_CONTENT_RETENTION_DAYS", "180")))
+    ret.add_argument("--archive-dir", help="Thư mục ghi file .jsonl.gz; bắt buộc trừ khi có --no-archive")
+    ret.add_argument("--no-archive", action="store_true", help="Xóa nội dung mà không lưu trữ")
+    ret.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    from database import engine
+
+    if args.command == "migrate":
+        applied = migrate(engine)
+        print(f"Applied {len(applied)} migration(s): {', '.join(applied) or 'none'}")
+    elif args.command == "partitions":
+        create_partitions(engine, args.months_ahead)
+    else:
+        if not args.archive_dir and not args.no_archive:
+            parser.error("retention needs --archive-dir or --no-archive")
+        total = archive_news_content(engine, args.content_days, args.archive_dir, args.batch_size)
+        print(f"Removed content from {total} articles older than {args.content_days} days")
+
+
+if __name__ == "__main__":
+    main()
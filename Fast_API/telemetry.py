@@ -0,0 +1,204 @@
+# Đo thời gian từng giai đoạn, đếm câu SQL và lần gọi dịch vụ ngoài của mỗi
+# request, xuất ra /metrics theo định dạng text của Prometheus.
+# Span kiểu OpenTelemetry được bật khi TELEMETRY_OTEL=1 và đã cài opentelemetry-api.
+import bisect
+import contextvars
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:  # opentelemetry là tùy chọn
+    otel_trace = None
+
+logger = logging.getLogger(__name__)
+
+SLOW_REQUEST_SECONDS = float(os.getenv("TELEMETRY_SLOW_REQUEST_SECONDS", "2.0"))
+_tracer = otel_trace.get_tracer("market-sentiment-api") if otel_trace and os.getenv("TELEMETRY_OTEL") == "1" else None
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000)
+
+
+def _format_labels(names, values, extra=""):
+    pairs = [f'{name}="{str(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                    cumulative += bucket_count
+                    le = f'le="{bound}"'
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+REQUESTS = Counter("http_requests_total", "HTTP requests by endpoint, method and status.", ("endpoint", "method", "status"))
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "HTTP request latency by endpoint.", ("endpoint", "method"))
+STAGE_SECONDS = Histogram("request_stage_duration_seconds", "Time spent per hot-path stage.", ("endpoint", "stage"))
+SQL_STATEMENTS = Histogram("request_sql_statements", "SQL statements executed per request.", ("endpoint",), COUNT_BUCKETS)
+UPSTREAM_CALLS = Histogram("request_upstream_calls", "Upstream HTTP calls per request.", ("endpoint",), COUNT_BUCKETS)
+UPSTREAM_TOTAL = Counter("upstream_calls_total", "Upstream HTTP calls by provider.", ("provider",))
+METRICS = (REQUESTS, REQUEST_SECONDS, STAGE_SECONDS, SQL_STATEMENTS, UPSTREAM_CALLS, UPSTREAM_TOTAL)
+
+
+class RequestTrace:
+    __slots__ = ("stages", "sql_statements", "upstream_calls")
+
+    def __init__(self):
+        self.stages = {}
+        self.sql_statements = 0
+        self.upstream_calls = 0
+
+
+_current = contextvars.ContextVar("request_trace", default=None)
+
+
+def count_upstream(provider):
+    UPSTREAM_TOTAL.inc(provider)
+    trace = _current.get()
+    if trace is not None:
+        trace.upstream_calls += 1
+
+
+@contextmanager
+def stage(name, upstream=None):
+    """Đo thời gian một giai đoạn; gọi nhiều lần trong một request thì cộng dồn
+    và được ghi vào histogram một lần khi request kết thúc.
+
+    `upstream` là tên dịch vụ ngoài nếu giai đoạn này gọi HTTP ra ngoài.
+    """
+    if upstream:
+        count_upstream(upstream)
+    span = _tracer.start_as_current_span(name) if _tracer else None
+    if span is not None:
+        span.__enter__()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        if span is not None:
+            span.__exit__(None, None, None)
+        trace = _current.get()
+        if trace is not None:
+            trace.stages[name] = trace.stages.get(name, 0.0) + elapsed
+
+
+def _count_sql(conn, cursor, statement, parameters, context, executemany):
+    trace = _current.get()
+    if trace is not None:
+        trace.sql_statements += 1
+
+
+def instrument_engine(engine):
+    """Đếm số câu SQL của mỗi request trên engine này."""
+    from sqlalchemy import event
+
+    event.listen(engine, "before_cursor_execute", _count_sql)
+
+
+class MetricsMiddleware:
+    """ASGI middleware ghi lại độ trễ, số câu SQL và số lần gọi ra ngoài theo endpoint."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace = RequestTrace()
+        token = _current.set(trace)
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        span = _tracer.start_as_current_span(f"{scope['method']} {scope['path']}") if _tracer else None
+        if span is not None:
+            span.__enter__()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            if span is not None:
+                span.__exit__(None, None, None)
+            _current.reset(token)
+            route = scope.get("route")
+            endpoint = getattr(route, "path", "unmatched")
+            method = scope["method"]
+            REQUESTS.inc(endpoint, method, status_code)
+            REQUEST_SECONDS.observe(elapsed, endpoint, method)
+            SQL_STATEMENTS.observe(trace.sql_statements, endpoint)
+            UPSTREAM_CALLS.observe(trace.upstream_calls, endpoint)
+            for name, seconds in trace.stages.items():
+                STAGE_SECONDS.observe(seconds, endpoint, name)
+            if elapsed >= SLOW_REQUEST_SECONDS:
+                breakdown = ", ".join(f"{name}={seconds:.3f}s" for name, seconds in trace.stages.items())
+                logger.warning(
+                    f"Slow request {method} {scope['path']}: {elapsed:.3f}s "
+                    f"(sql={trace.sql_statements}, upstream={trace.upstream_calls}, {breakdown})"
+                )
+
+
+def render_metrics():
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"